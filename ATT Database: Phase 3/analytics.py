@@ -0,0 +1,215 @@
+"""
+Vectorized NumPy versions of Query 3 and Query 5.
+
+The invoice, account, contract and plan columns are pulled once into NumPy
+arrays (money as int64 cents, ids and statuses as integer codes), optionally
+saved as a local .npz extract, and the reports are computed with masks,
+fancy indexing and bincount group-bys. Results are column arrays (money in
+cents); to_rows() turns them into tuples shaped like the SQL rows, and
+verify() checks them against the SQL reports.
+
+Usage:
+    python analytics.py --save extract.npz          # pull from ATT_DATABASE_URL
+    python analytics.py --extract extract.npz       # run offline
+    python analytics.py --verify
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from COMP353_project3 import Account, Contract, Invoice, Plan
+from core_reports import fetch_columns
+
+
+def to_cents(values) -> np.ndarray:
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _codes(ids: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Positions of `keys` in the sorted id array `ids`."""
+    codes = np.searchsorted(ids, keys)
+    if len(keys) and (codes.max() >= len(ids) or not np.array_equal(ids[codes], keys)):
+        raise ValueError("Extract has references to missing ids")
+    return codes
+
+
+# ============================
+#          EXTRACT
+# ============================
+@dataclass
+class Extract:
+    account_ids: np.ndarray        # sorted str ids
+    account_balance: np.ndarray    # int64 cents, per account code
+    plan_ids: np.ndarray           # sorted str ids
+    plan_name: np.ndarray          # str, per plan code
+    plan_fee: np.ndarray           # int64 cents, per plan code
+    contract_account: np.ndarray   # account code
+    contract_plan: np.ndarray      # plan code
+    contract_active: np.ndarray    # bool
+    invoice_account: np.ndarray    # account code
+    invoice_amount: np.ndarray     # int64 cents
+    invoice_status: np.ndarray     # 0 other, 1 paid, 2 unpaid, 3 overdue
+
+    @property
+    def rows(self) -> int:
+        return len(self.account_ids) + len(self.plan_ids) + len(self.contract_account) + len(self.invoice_account)
+
+    def save(self, path: str) -> None:
+        np.savez(path, **self.__dict__)
+
+    @classmethod
+    def load(cls, path: str) -> "Extract":
+        with np.load(path) as data:
+            return cls(**{k: data[k] for k in cls.__dataclass_fields__})
+
+
+INVOICE_STATUS_CODES = {"paid": 1, "unpaid": 2, "overdue": 3}
+
+
+def pull_extract(conn) -> Extract:
+    """Read the needed columns with the Core column-array path."""
+    accounts = fetch_columns(conn, select(Account.AccountID, Account.AccountBalance).order_by(Account.AccountID))
+    plans = fetch_columns(conn, select(Plan.PlanID, Plan.PlanName, Plan.PlanMonthlyFee).order_by(Plan.PlanID))
+    contracts = fetch_columns(conn, select(Contract.AccountID, Contract.PlanID, Contract.ContractStatus))
+    invoices = fetch_columns(conn, select(Invoice.AccountID, Invoice.InvoiceAmount, Invoice.InvoiceStatus))
+
+    account_ids = np.array(accounts["AccountID"])
+    plan_ids = np.array(plans["PlanID"])
+    status_lookup = np.vectorize(lambda s: INVOICE_STATUS_CODES.get(s, 0), otypes=[np.int8])
+
+    return Extract(
+        account_ids=account_ids,
+        account_balance=to_cents(accounts["AccountBalance"]),
+        plan_ids=plan_ids,
+        plan_name=np.array(plans["PlanName"]),
+        plan_fee=to_cents(plans["PlanMonthlyFee"]),
+        contract_account=_codes(account_ids, np.array(contracts["AccountID"])),
+        contract_plan=_codes(plan_ids, np.array(contracts["PlanID"])),
+        contract_active=np.array(contracts["ContractStatus"]) == "active",
+        invoice_account=_codes(account_ids, np.array(invoices["AccountID"])),
+        invoice_amount=to_cents(invoices["InvoiceAmount"]),
+        invoice_status=status_lookup(np.array(invoices["InvoiceStatus"], dtype=object))
+        if len(invoices["InvoiceStatus"]) else np.zeros(0, dtype=np.int8),
+    )
+
+
+# ============================
+#          REPORTS
+# ============================
+def underfunded_active_contracts(x: Extract) -> Dict[str, np.ndarray]:
+    """Query 3 as column arrays, ordered by AccountBalance desc."""
+    balance = x.account_balance[x.contract_account]
+    fee = x.plan_fee[x.contract_plan]
+    hit = np.flatnonzero(x.contract_active & (balance < fee))
+    hit = hit[np.argsort(-balance[hit], kind="stable")]
+    return {
+        "PlanName": x.plan_name[x.contract_plan[hit]],
+        "PlanMonthlyFee": fee[hit],
+        "ContractStatus": np.full(len(hit), "active"),
+        "AccountBalance": balance[hit],
+    }
+
+
+def invoice_payment_summary(x: Extract) -> Dict[str, np.ndarray]:
+    """Query 5 as column arrays, ordered by unpaid amount desc."""
+    n = len(x.account_ids)
+    acc = x.invoice_account
+    amount = x.invoice_amount.astype(np.float64)  # exact: cents stay far below 2**53
+
+    def total(status=None) -> np.ndarray:
+        weights = amount if status is None else np.where(x.invoice_status == status, amount, 0)
+        return np.bincount(acc, weights=weights, minlength=n).astype(np.int64)
+
+    count = np.bincount(acc, minlength=n)
+    unpaid = total(INVOICE_STATUS_CODES["unpaid"])
+    has = np.flatnonzero(count)
+    has = has[np.argsort(-unpaid[has], kind="stable")]
+    return {
+        "AccountID": x.account_ids[has],
+        "TotalInvoiceAmount": total()[has],
+        "TotalPaidAmount": total(INVOICE_STATUS_CODES["paid"])[has],
+        "TotalUnpaidAmount": unpaid[has],
+        "NumOverdueInvoices": np.bincount(acc, weights=x.invoice_status == INVOICE_STATUS_CODES["overdue"],
+                                          minlength=n).astype(np.int64)[has],
+    }
+
+
+# Result columns holding int64 cents.
+MONEY_COLUMNS = {"PlanMonthlyFee", "AccountBalance", "TotalInvoiceAmount", "TotalPaidAmount", "TotalUnpaidAmount"}
+
+
+def to_rows(columns: Dict[str, np.ndarray]) -> List[Tuple]:
+    """Column arrays back to row tuples shaped like the SQL report (money in dollars)."""
+    values = [(c / 100).tolist() if name in MONEY_COLUMNS else c.tolist() for name, c in columns.items()]
+    return list(zip(*values))
+
+
+ANALYTICS = {
+    "q3_underfunded_active_contracts": underfunded_active_contracts,
+    "q5_invoice_payment_summary": invoice_payment_summary,
+}
+
+
+# ============================
+#        VERIFICATION
+# ============================
+def _normalize(rows) -> List[Tuple]:
+    """Round money to cents and sort, so ties in the ORDER BY don't matter."""
+    return sorted(tuple(round(v, 2) if isinstance(v, float) else v for v in row) for row in rows)
+
+
+def verify(engine, x: Extract = None) -> Dict[str, bool]:
+    from COMP353_project3 import REPORTS
+
+    with engine.connect() as conn:
+        if x is None:
+            x = pull_extract(conn)
+        results = {}
+        for name, fn in ANALYTICS.items():
+            sql_rows = [tuple(r) for r in conn.execute(REPORTS[name]())]
+            results[name] = _normalize(to_rows(fn(x))) == _normalize(sql_rows)
+    return results
+
+
+def main():
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="NumPy versions of Query 3 and Query 5")
+    parser.add_argument("--extract", help="run on a saved .npz extract instead of the database")
+    parser.add_argument("--save", help="pull an extract from the database and save it here")
+    parser.add_argument("--verify", action="store_true", help="compare against the SQL reports")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.extract:
+        x = Extract.load(args.extract)
+    else:
+        start = time.perf_counter()
+        with get_engine().connect() as conn:
+            x = pull_extract(conn)
+        print(f"extract: {x.rows} rows in {time.perf_counter() - start:.2f} s")
+        if args.save:
+            x.save(args.save)
+
+    for name, fn in ANALYTICS.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = fn(x)
+            best = min(best, time.perf_counter() - start)
+        rows = len(next(iter(result.values())))
+        source_rows = len(x.contract_account) if name.startswith("q3") else len(x.invoice_account)
+        print(f"{name:<36} {rows:>9} rows  {best * 1000:>8.2f} ms  {source_rows / best:>14,.0f} input rows/s")
+
+    if args.verify:
+        for name, ok in verify(get_engine(), x).items():
+            print(f"{'ok' if ok else 'MISMATCH':<9} {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Run the report queries concurrently on an AsyncEngine.
+
+Every report gets its own AsyncSession (sessions are not safe to share
+between tasks) and an asyncio.Semaphore caps how many run at once, which
+should stay at or below the pool size. Total wall time then approaches the
+slowest report instead of the sum of all of them.
+
+Usage:
+    python async_reports.py --concurrency 4
+"""
+
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from COMP353_project3 import REPORTS
+from database import EngineConfig, make_async_engine
+
+DEFAULT_CONCURRENCY = 4
+
+
+@dataclass
+class ReportResult:
+    name: str
+    rows: List
+    seconds: float
+
+
+async def run_report(engine, name: str, builder: Callable, semaphore: asyncio.Semaphore) -> ReportResult:
+    async with semaphore:
+        start = time.perf_counter()
+        async with AsyncSession(engine) as session:
+            result = await session.execute(builder())
+            rows = result.all()
+        return ReportResult(name, rows, time.perf_counter() - start)
+
+
+async def run_reports(engine, reports: Dict[str, Callable] = REPORTS,
+                      concurrency: int = DEFAULT_CONCURRENCY) -> Dict[str, ReportResult]:
+    """Run `reports` concurrently, at most `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(
+        *(run_report(engine, name, builder, semaphore) for name, builder in reports.items())
+    )
+    return {r.name: r for r in results}
+
+
+async def _main(args) -> None:
+    engine = make_async_engine(EngineConfig.from_env())
+    try:
+        start = time.perf_counter()
+        results = await run_reports(engine, concurrency=args.concurrency)
+        wall = time.perf_counter() - start
+    finally:
+        await engine.dispose()
+
+    for r in results.values():
+        print(f"{r.name:<42} {len(r.rows):>9} rows {r.seconds * 1000:>10.1f} ms")
+    total = sum(r.seconds for r in results.values())
+    slowest = max(r.seconds for r in results.values())
+    print(f"\nwall {wall * 1000:.1f} ms, sum of reports {total * 1000:.1f} ms, slowest {slowest * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the reports concurrently")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
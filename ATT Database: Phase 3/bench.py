@@ -0,0 +1,274 @@
+"""
+Benchmark harness for the Phase 3 report queries.
+
+For every data scale, a database is (re)built with datagen, then each case
+is warmed up and run repeatedly. Latency p50/p95, rows per second and peak
+Python memory are reported and written to JSON so results can be compared
+between commits.
+
+After the reports, the load cases time writing the scale's generated data
+into an emptied schema: bulk_load() against the unit of work
+(session.add_all + commit per chunk). Each run starts from dropped and
+recreated tables, which is not timed, and neither is generating the rows.
+
+Without --url every scale gets its own throwaway SQLite file. With --url
+(e.g. a local Postgres) the ATT tables in that database are DROPPED and
+recreated for each scale.
+
+Usage:
+    python bench.py --scales 1000,10000 --repeat 20 --out bench_results.json
+    python bench.py --cases load_bulk,load_orm_add_all --repeat 3
+    python bench.py --url postgresql+psycopg2://postgres@localhost/bench --compare old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import sqlalchemy
+from sqlalchemy.orm import Session
+
+import datagen
+from bulk_load import LOAD_ORDER, LoadReport, bulk_load
+from COMP353_project3 import REPORTS, Base, create_schema
+from database import EngineConfig, make_engine
+from explain import analyze_tables
+from invoice_summary import refresh_invoice_summary
+
+DEFAULT_SCALES = [1_000, 10_000]
+
+
+# ============================
+#           CASES
+# ============================
+# A case takes an engine, runs one report end to end and returns the
+# number of rows it produced.
+def orm_case(builder) -> Callable:
+    def run(engine) -> int:
+        with Session(engine) as session:
+            return len(session.execute(builder()).all())
+    return run
+
+
+CASES: Dict[str, Callable] = {name: orm_case(builder) for name, builder in REPORTS.items()}
+# q6's window starts at date.today() by default; anchor it at the date the
+# data is generated as of, so its rows do not depend on when the bench runs.
+CASES["q6_contracts_expiring_30d"] = orm_case(
+    partial(REPORTS["q6_contracts_expiring_30d"], today=datagen.AS_OF))
+
+
+# A load case takes an engine with empty tables and the scale's datagen
+# chunks, writes them and returns the number of rows written.
+def bulk_load_case(engine, chunks) -> int:
+    report = LoadReport()
+    for chunk in chunks:
+        bulk_load(engine, chunk, report=report, log=None)
+    return report.rows
+
+
+def orm_add_all_case(engine, chunks) -> int:
+    """The unit-of-work path: ORM instances, session.add_all, one commit per chunk."""
+    rows = 0
+    with Session(engine) as session:
+        for chunk in chunks:
+            objects = datagen.to_orm(chunk)
+            for name in LOAD_ORDER:
+                session.add_all(objects.get(name, []))
+            session.commit()
+            session.expunge_all()
+            rows += sum(len(v) for v in objects.values())
+    return rows
+
+
+LOAD_CASES: Dict[str, Callable] = {
+    "load_bulk": bulk_load_case,
+    "load_orm_add_all": orm_add_all_case,
+}
+
+
+def reset_schema(engine) -> None:
+    Base.metadata.drop_all(engine)
+    create_schema(engine)
+
+
+# ============================
+#         MEASUREMENT
+# ============================
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[k]
+
+
+def measure(case: Callable, engine, warmup: int = 2, repeat: int = 10,
+            setup: Optional[Callable] = None) -> dict:
+    """Time case(engine); setup(engine), if given, runs untimed before every call."""
+    setup = setup or (lambda engine: None)
+    for _ in range(warmup):
+        setup(engine)
+        case(engine)
+
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        setup(engine)
+        start = time.perf_counter()
+        rows = case(engine)
+        timings.append(time.perf_counter() - start)
+
+    # Memory is traced on a separate run; tracemalloc would skew the timings.
+    setup(engine)
+    tracemalloc.start()
+    try:
+        case(engine)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50 = percentile(timings, 50)
+    return {
+        "rows": rows,
+        "runs": repeat,
+        "p50_ms": p50 * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "rows_per_sec": rows / p50 if p50 else 0.0,
+        "peak_mem_kb": peak / 1024,
+    }
+
+
+def build_database(url, scale: int, seed: int, workdir: str):
+    if url is None:
+        url = f"sqlite:///{os.path.join(workdir, f'att_{scale}.db')}"
+    engine = make_engine(EngineConfig(url=url))
+    Base.metadata.drop_all(engine)
+    create_schema(engine)
+    datagen.load(engine, scale, seed=seed)
+    with engine.begin() as conn:
+        refresh_invoice_summary(conn)
+    analyze_tables(engine)
+    return engine
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_result(result: dict) -> None:
+    print(
+        f"{result['scale']:>10} {result['case']:<36} {result['rows']:>9} rows "
+        f"p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+        f"{result['rows_per_sec']:>12.0f} rows/s  {result['peak_mem_kb']:>10.0f} KB"
+    )
+
+
+def run(url=None, scales=DEFAULT_SCALES, cases=None, load_cases=None, warmup=2, repeat=10,
+        seed=datagen.DEFAULT_SEED) -> dict:
+    """Report cases on each scale's database, then load cases (which empty it)."""
+    if cases is None and load_cases is None:
+        cases, load_cases = CASES, LOAD_CASES
+    cases, load_cases = cases or {}, load_cases or {}
+    results = []
+    dialect = None
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            engine = build_database(url, scale, seed, workdir)
+            dialect = engine.dialect.name
+            for name, case in cases.items():
+                result = measure(case, engine, warmup=warmup, repeat=repeat)
+                result.update(scale=scale, case=name)
+                results.append(result)
+                _print_result(result)
+            if load_cases:
+                chunks = list(datagen.generate(scale, seed=seed))
+            for name, load in load_cases.items():
+                result = measure(lambda e: load(e, chunks), engine, warmup=min(warmup, 1),
+                                 repeat=repeat, setup=reset_schema)
+                result.update(scale=scale, case=name)
+                results.append(result)
+                _print_result(result)
+            engine.dispose()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "dialect": dialect,
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "seed": seed,
+            "warmup": warmup,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(old: dict, new: dict) -> None:
+    """Print the p50 change of every (scale, case) present in both runs."""
+    before = {(r["scale"], r["case"]): r for r in old["results"]}
+    print(f"\nvs {old['meta'].get('commit')}:")
+    for r in new["results"]:
+        prev = before.get((r["scale"], r["case"]))
+        if prev is None or not prev["p50_ms"]:
+            continue
+        change = (r["p50_ms"] - prev["p50_ms"]) / prev["p50_ms"] * 100
+        print(f"{r['scale']:>10} {r['case']:<36} {prev['p50_ms']:>9.2f} -> {r['p50_ms']:>9.2f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Phase 3 reports")
+    parser.add_argument("--url", help="database URL (default: throwaway SQLite per scale)")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="comma separated customer counts")
+    parser.add_argument("--cases", help="comma separated subset of: " + ", ".join([*CASES, *LOAD_CASES]))
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=datagen.DEFAULT_SEED)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    cases, load_cases = CASES, LOAD_CASES
+    if args.cases:
+        names = args.cases.split(",")
+        unknown = set(names) - set(CASES) - set(LOAD_CASES)
+        if unknown:
+            parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+        cases = {name: CASES[name] for name in names if name in CASES}
+        load_cases = {name: LOAD_CASES[name] for name in names if name in LOAD_CASES}
+
+    results = run(
+        url=args.url,
+        scales=[int(s) for s in args.scales.split(",")],
+        cases=cases,
+        load_cases=load_cases,
+        warmup=args.warmup,
+        repeat=args.repeat,
+        seed=args.seed,
+    )
+    with open(args.out, "w") as fp:
+        json.dump(results, fp, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(json.load(fp), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Set-based monthly billing run.
+
+A run bills one cycle (a calendar month): every active contract whose term
+overlaps the month gets one invoice for its plan's PlanMonthlyFee, dated
+the first of the month and due 30 days later. No invoice is built in
+Python; each chunk of accounts is three statements in one transaction:
+
+    INSERT INTO invoice ... SELECT ... FROM contract JOIN plan   (new invoices)
+    UPDATE account SET AccountBalance = AccountBalance + :amount  (charge them)
+    INSERT INTO billing_run_chunk ...                             (progress)
+
+followed by refresh_invoice_summary() for the accounts billed.
+
+Chunks are AccountID ranges (lo, hi] of `chunk_size` accounts with active
+contracts, found by seeking ix_contract_active_account. A chunk commits
+or rolls back as a whole, and a restarted run resumes after the last
+committed chunk of the cycle. Invoice ids are deterministic,
+'I' + YYYYMM + ContractID, and existing ids are skipped, so billing a
+contract twice for the same month is impossible even across runs. Accounts
+are charged from the INSERT's RETURNING rows, i.e. only for the invoices
+the chunk actually created, so re-running a chunk whose progress row was
+lost charges nothing twice.
+
+AccountBalance is what the account owes: in the seed data it equals the
+account's invoiced amount, and the Phase 2 schema checks it is never
+negative. A new invoice adds its amount to it, so a billing run can only
+raise balances.
+
+Usage:
+    python billing.py --cycle 2026-11
+    python billing.py --cycle 2026-11 --chunk-size 50000
+    python billing.py --cycle 2026-11 --status
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Date, bindparam, exists, func, insert, literal, or_, select, update
+from sqlalchemy.orm import aliased
+
+from COMP353_project3 import Account, BillingRunChunk, Contract, Invoice, Plan
+from invoice_summary import refresh_invoice_summary
+from partitioning import month_start, next_month, parse_month
+
+DEFAULT_CHUNK_SIZE = 50_000
+PAYMENT_TERMS = timedelta(days=30)
+ACTIVE = Contract.ContractStatus == "active"
+
+
+def invoice_id_prefix(cycle: date) -> str:
+    return f"I{cycle.year:04d}{cycle.month:02d}"
+
+
+# ============================
+#           CHUNKS
+# ============================
+def _accounts_after(lo: Optional[str]):
+    stmt = select(Contract.AccountID).where(ACTIVE)
+    if lo is not None:
+        stmt = stmt.where(Contract.AccountID > lo)
+    return stmt
+
+
+def next_chunk(conn, lo: Optional[str], chunk_size: int) -> Optional[str]:
+    """Upper bound of the chunk after `lo`: its chunk_size-th account, or the last one."""
+    accounts = _accounts_after(lo).group_by(Contract.AccountID).order_by(Contract.AccountID)
+    hi = conn.execute(accounts.offset(chunk_size - 1).limit(1)).scalar()
+    if hi is None:
+        hi = conn.execute(_accounts_after(lo).with_only_columns(func.max(Contract.AccountID))).scalar()
+    return hi
+
+
+def last_chunk_end(conn, cycle: date) -> Optional[str]:
+    return conn.execute(
+        select(func.max(BillingRunChunk.ChunkEnd)).where(BillingRunChunk.Cycle == cycle)
+    ).scalar()
+
+
+# ============================
+#          STATEMENTS
+# ============================
+def billable_invoices(cycle: date, lo: Optional[str], hi: str):
+    """SELECT of the cycle's new invoice rows for active contracts in (lo, hi]."""
+    invoice_id = literal(invoice_id_prefix(cycle)) + Contract.ContractID
+    billed = aliased(Invoice)
+    stmt = (
+        select(
+            invoice_id,
+            Contract.AccountID,
+            literal(cycle, Date),
+            literal(cycle + PAYMENT_TERMS, Date),
+            Plan.PlanMonthlyFee,
+            literal("unpaid"),
+        )
+        .join(Plan, Contract.PlanID == Plan.PlanID)
+        .where(
+            ACTIVE,
+            Contract.AccountID <= hi,
+            or_(Contract.ContractStartDate.is_(None), Contract.ContractStartDate < next_month(cycle)),
+            or_(Contract.ContractEndDate.is_(None), Contract.ContractEndDate >= cycle),
+            ~exists().where(billed.InvoiceID == invoice_id),
+        )
+    )
+    if lo is not None:
+        stmt = stmt.where(Contract.AccountID > lo)
+    return stmt
+
+
+def charge_accounts():
+    """UPDATE adding :amount to what :account owes, executed once per account (executemany)."""
+    account = Account.__table__
+    return (
+        update(account)
+        .where(account.c.AccountID == bindparam("account"))
+        .values(AccountBalance=account.c.AccountBalance + bindparam("amount"))
+    )
+
+
+def _charges(billed) -> List[dict]:
+    totals: Dict[str, float] = defaultdict(float)
+    for row in billed:
+        totals[row.AccountID] += row.InvoiceAmount
+    return [{"account": account, "amount": amount} for account, amount in sorted(totals.items())]
+
+
+# ============================
+#            RUN
+# ============================
+@dataclass
+class ChunkResult:
+    start: Optional[str]
+    end: str
+    invoices: int
+    amount: float
+    seconds: float
+
+
+@dataclass
+class BillingRunReport:
+    cycle: date
+    resumed_after: Optional[str] = None
+    chunks: List[ChunkResult] = field(default_factory=list)
+
+    @property
+    def invoices(self) -> int:
+        return sum(c.invoices for c in self.chunks)
+
+    @property
+    def seconds(self) -> float:
+        return sum(c.seconds for c in self.chunks)
+
+    def __str__(self) -> str:
+        rate = self.invoices / self.seconds if self.seconds else 0.0
+        resumed = f", resumed after {self.resumed_after}" if self.resumed_after else ""
+        return (
+            f"cycle {self.cycle:%Y-%m}: {self.invoices} invoices in {len(self.chunks)} chunks, "
+            f"{self.seconds:.2f} s ({rate:.0f} invoices/s){resumed}"
+        )
+
+
+def bill_chunk(conn, cycle: date, lo: Optional[str], hi: str) -> Tuple[int, float]:
+    """Invoice, charge and record one chunk on `conn`; returns (invoices, amount)."""
+    columns = ["InvoiceID", "AccountID", "InvoiceDate", "InvoiceDueDate", "InvoiceAmount", "InvoiceStatus"]
+    billed = conn.execute(
+        insert(Invoice)
+        .from_select(columns, billable_invoices(cycle, lo, hi))
+        .returning(Invoice.AccountID, Invoice.InvoiceAmount)
+    ).all()
+    amount = round(sum(row.InvoiceAmount for row in billed), 2)
+    if billed:
+        conn.execute(charge_accounts(), _charges(billed))
+        refresh_invoice_summary(conn, {row.AccountID for row in billed})
+    conn.execute(insert(BillingRunChunk).values(
+        Cycle=cycle,
+        ChunkStart=lo,
+        ChunkEnd=hi,
+        Invoices=len(billed),
+        Amount=amount,
+        CompletedAt=datetime.now(timezone.utc).replace(tzinfo=None),
+    ))
+    return len(billed), amount
+
+
+def _ensure_partition(engine, cycle: date) -> None:
+    if engine.dialect.name != "postgresql":
+        return
+    from partitioning import create_partition, partitions
+
+    with engine.begin() as conn:
+        if partitions(conn):
+            create_partition(conn, cycle)
+
+
+def iter_billing_run(engine, cycle: date, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[ChunkResult]:
+    """Bill `cycle` chunk by chunk, one transaction each, resuming after the last committed chunk."""
+    cycle = month_start(cycle)
+    _ensure_partition(engine, cycle)
+    with engine.connect() as conn:
+        lo = last_chunk_end(conn, cycle)
+    while True:
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            hi = next_chunk(conn, lo, chunk_size)
+            if hi is None:
+                return
+            invoices, amount = bill_chunk(conn, cycle, lo, hi)
+        yield ChunkResult(lo, hi, invoices, amount, time.perf_counter() - start)
+        lo = hi
+
+
+def run_billing(engine, cycle: date, chunk_size: int = DEFAULT_CHUNK_SIZE, log=print) -> BillingRunReport:
+    cycle = month_start(cycle)
+    with engine.connect() as conn:
+        report = BillingRunReport(cycle, last_chunk_end(conn, cycle))
+    for chunk in iter_billing_run(engine, cycle, chunk_size):
+        report.chunks.append(chunk)
+        if log is not None:
+            log(f"  ({chunk.start or ''}, {chunk.end}]  {chunk.invoices:>8} invoices  "
+                f"{chunk.amount:>14.2f}  {chunk.seconds:>7.2f} s")
+    if log is not None:
+        log(str(report))
+    return report
+
+
+def billing_status(conn, cycle: date) -> Tuple[int, int, float]:
+    """(chunks, invoices, amount) committed so far for `cycle`."""
+    chunks, invoices, amount = conn.execute(
+        select(func.count(), func.sum(BillingRunChunk.Invoices), func.sum(BillingRunChunk.Amount))
+        .where(BillingRunChunk.Cycle == month_start(cycle))
+    ).one()
+    return chunks, invoices or 0, amount or 0.0
+
+
+def main():
+    from COMP353_project3 import create_schema
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Generate a month's invoices for every active contract")
+    parser.add_argument("--cycle", type=parse_month, required=True, help="billing month, e.g. 2026-11")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="accounts per chunk")
+    parser.add_argument("--status", action="store_true", help="show progress of the cycle and exit")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    create_schema(engine)
+    if args.status:
+        with engine.connect() as conn:
+            chunks, invoices, amount = billing_status(conn, args.cycle)
+            print(f"cycle {args.cycle:%Y-%m}: {chunks} chunks committed, {invoices} invoices, "
+                  f"{amount:.2f} billed, last account {last_chunk_end(conn, args.cycle)}")
+        return
+    run_billing(engine, args.cycle, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
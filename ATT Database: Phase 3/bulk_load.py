@@ -0,0 +1,198 @@
+"""
+Bulk loader for the ATT tables.
+
+Rows are written in foreign key order (customer -> account -> plan ->
+contract/device/invoice) in batches, either as multi-row INSERTs or, on
+PostgreSQL with psycopg2, through COPY ... FROM STDIN. This skips the ORM
+unit of work entirely, which is what makes it usable for millions of rows.
+
+Usage:
+    from bulk_load import bulk_load
+    bulk_load(engine, seed_data(), batch_size=10_000)
+"""
+
+import csv
+import io
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import inspect
+
+from COMP353_project3 import Base
+
+LOAD_ORDER = ("customer", "account", "plan", "contract", "device", "invoice")
+
+DEFAULT_BATCH_SIZE = 10_000
+
+
+# ============================
+#       THROUGHPUT REPORT
+# ============================
+@dataclass
+class TableLoadStats:
+    table: str
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class LoadReport:
+    method: str = ""
+    tables: Dict[str, TableLoadStats] = field(default_factory=dict)
+
+    def add(self, table: str, rows: int, seconds: float) -> None:
+        stats = self.tables.setdefault(table, TableLoadStats(table))
+        stats.rows += rows
+        stats.seconds += seconds
+
+    @property
+    def rows(self) -> int:
+        return sum(t.rows for t in self.tables.values())
+
+    @property
+    def seconds(self) -> float:
+        return sum(t.seconds for t in self.tables.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        lines = [f"{'Table':<12} {'Rows':>12} {'Seconds':>10} {'Rows/s':>12}"]
+        for name in LOAD_ORDER:
+            if name in self.tables:
+                t = self.tables[name]
+                lines.append(f"{t.table:<12} {t.rows:>12} {t.seconds:>10.2f} {t.rows_per_second:>12.0f}")
+        lines.append(
+            f"{'total':<12} {self.rows:>12} {self.seconds:>10.2f} {self.rows_per_second:>12.0f}"
+            f"  ({self.method})"
+        )
+        return "\n".join(lines)
+
+
+# ============================
+#         ROW HANDLING
+# ============================
+def _table_name(key) -> str:
+    if isinstance(key, str):
+        return key
+    return key.__tablename__
+
+
+def _row_values(table, row) -> dict:
+    """Turn a dict or ORM instance into a full column -> value dict."""
+    if not isinstance(row, dict):
+        state = inspect(row)
+        row = {attr.key: attr.value for attr in state.attrs if attr.key in table.c}
+    values = {}
+    for column in table.columns:
+        value = row.get(column.key)
+        if value is None and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+        values[column.key] = value
+    return values
+
+
+def _batches(rows: Iterable, size: int):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _resolve_method(engine, method: str) -> str:
+    if method != "auto":
+        return method
+    if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        return "copy"
+    return "insert"
+
+
+# ============================
+#         WRITERS
+# ============================
+def _insert_batch(conn, table, batch) -> None:
+    # executemany on a Core insert; SQLAlchemy turns this into multi-row
+    # VALUES statements ("insertmanyvalues") on drivers that support it.
+    conn.execute(table.insert(), batch)
+
+
+def _copy_batch(conn, table, batch) -> None:
+    preparer = conn.dialect.identifier_preparer
+    columns = [c.key for c in table.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow([r"\N" if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(
+        preparer.format_table(table),
+        ", ".join(preparer.quote(c) for c in columns),
+    )
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
+_WRITERS = {"insert": _insert_batch, "copy": _copy_batch}
+
+
+# ============================
+#         LOADER
+# ============================
+def bulk_load(
+    engine,
+    data: dict,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    method: str = "auto",
+    report: Optional[LoadReport] = None,
+    log: Optional[Callable[[str], None]] = print,
+) -> LoadReport:
+    """
+    Load `data` (table name or model class -> iterable of dicts / ORM
+    instances) in foreign key order. Each batch is committed on its own so
+    a failure part way through a large load does not roll back everything.
+
+    method is "insert", "copy" (PostgreSQL + psycopg2 only) or "auto".
+    Pass an existing `report` to accumulate stats over several calls.
+    """
+    method = _resolve_method(engine, method)
+    if method not in _WRITERS:
+        raise ValueError(f"Unknown load method: {method}")
+    write = _WRITERS[method]
+
+    by_table = {_table_name(key): rows for key, rows in data.items()}
+    unknown = set(by_table) - set(LOAD_ORDER)
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+
+    if report is None:
+        report = LoadReport()
+    report.method = method
+
+    for name in LOAD_ORDER:
+        if name not in by_table:
+            continue
+        table = Base.metadata.tables[name]
+        rows = (_row_values(table, row) for row in by_table[name])
+
+        for batch in _batches(rows, batch_size):
+            start = time.perf_counter()
+            with engine.begin() as conn:
+                write(conn, table, batch)
+            report.add(name, len(batch), time.perf_counter() - start)
+
+    if log is not None:
+        log(str(report))
+    return report
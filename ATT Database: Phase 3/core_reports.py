@@ -0,0 +1,188 @@
+"""
+Lightweight, read-only reporting on SQLAlchemy Core.
+
+The report statements are executed on a plain Connection: no Session, no
+identity map, no ORM result hydration. Rows come back in one of three
+compact shapes:
+
+  * tuples   - plain tuples straight from the DBAPI cursor when every
+               selected column is a type the driver already returns as the
+               right Python value (strings, ints, floats); otherwise Core
+               rows converted to tuples
+  * records  - instances of a generated __slots__ class, attribute access
+               without a per-row dict
+  * columns  - column arrays; int/float columns are packed into array.array
+
+Usage:
+    python core_reports.py --report q1_active_contract_customers --repeat 5
+"""
+
+import argparse
+import itertools
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import Float, Integer, String
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Types whose DBAPI values need no SQLAlchemy result processing.
+RAW_SAFE_TYPES = (String, Integer, Float)
+
+# Server-side cursor names are per connection; each export gets its own so
+# two open iterators on one connection do not collide.
+_cursor_ids = itertools.count(1)
+
+
+def column_names(stmt) -> List[str]:
+    return [c.key for c in stmt.selected_columns]
+
+
+def _raw_safe(stmt) -> bool:
+    for col in stmt.selected_columns:
+        if not isinstance(col.type, RAW_SAFE_TYPES):
+            return False
+        if isinstance(col.type, Float) and col.type.asdecimal:
+            return False
+    return True
+
+
+def _iter_cursor(conn, stmt, batch_size: int) -> Iterator[Tuple]:
+    # Run the compiled SQL on a DBAPI cursor of the connection's current
+    # transaction; rows are the driver's own tuples. psycopg2 gets a named
+    # (server-side) cursor so large exports stream. render_postcompile
+    # expands "post compile" parameters (IN lists) that Connection.execute
+    # would otherwise expand itself.
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    dbapi_conn = conn.connection.dbapi_connection
+    if conn.dialect.driver == "psycopg2":
+        cursor = dbapi_conn.cursor(name=f"core_reports_export_{next(_cursor_ids)}")
+        cursor.itersize = batch_size
+    else:
+        cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute(compiled.string, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield from batch
+    finally:
+        cursor.close()
+
+
+def iter_tuples(conn, stmt, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Tuple]:
+    """Yield rows of `stmt` as plain tuples, `batch_size` per fetch."""
+    if _raw_safe(stmt):
+        yield from _iter_cursor(conn, stmt, batch_size)
+        return
+
+    result = conn.execute(stmt.execution_options(stream_results=True))
+    try:
+        for partition in result.partitions(batch_size):
+            yield from map(tuple, partition)
+    finally:
+        result.close()
+
+
+def fetch_tuples(conn, stmt) -> List[Tuple]:
+    return list(iter_tuples(conn, stmt))
+
+
+_record_types: Dict[Tuple[str, ...], type] = {}
+
+
+def record_type(names) -> type:
+    """A __slots__ record class for these column names (cached)."""
+    names = tuple(names)
+    cls = _record_types.get(names)
+    if cls is None:
+        def __init__(self, *values):
+            for name, value in zip(names, values):
+                setattr(self, name, value)
+
+        def __repr__(self):
+            return "Record(" + ", ".join(f"{n}={getattr(self, n)!r}" for n in names) + ")"
+
+        cls = type("Record", (), {"__slots__": names, "__init__": __init__, "__repr__": __repr__})
+        _record_types[names] = cls
+    return cls
+
+
+def fetch_records(conn, stmt) -> List:
+    cls = record_type(column_names(stmt))
+    return [cls(*row) for row in iter_tuples(conn, stmt)]
+
+
+def fetch_columns(conn, stmt) -> Dict[str, object]:
+    """Column arrays: {name: array('q'|'d') or list}."""
+    names = column_names(stmt)
+    columns: List[object] = []
+    for col in stmt.selected_columns:
+        if isinstance(col.type, Integer):
+            columns.append(array("q"))
+        elif isinstance(col.type, Float) and not col.type.asdecimal:
+            columns.append(array("d"))
+        else:
+            columns.append([])
+
+    for row in iter_tuples(conn, stmt):
+        for i, value in enumerate(row):
+            try:
+                columns[i].append(value)
+            except TypeError:
+                # NULL (or an unexpected type) in a packed column: fall back to a list.
+                columns[i] = list(columns[i])
+                columns[i].append(value)
+    return dict(zip(names, columns))
+
+
+# ============================
+#     CORE vs ORM BENCHMARK
+# ============================
+def cases_for(builder) -> Dict[str, object]:
+    from bench import orm_case
+
+    def core(fetch):
+        def run(engine) -> int:
+            with engine.connect() as conn:
+                result = fetch(conn, builder())
+                return len(next(iter(result.values()))) if isinstance(result, dict) else len(result)
+        return run
+
+    return {
+        "orm_session": orm_case(builder),
+        "core_tuples": core(fetch_tuples),
+        "core_records": core(fetch_records),
+        "core_columns": core(fetch_columns),
+    }
+
+
+def main():
+    from bench import measure
+    from COMP353_project3 import REPORTS
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Compare ORM and Core read paths")
+    parser.add_argument("--report", choices=sorted(REPORTS), default="q1_active_contract_customers")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    for name, case in cases_for(REPORTS[args.report]).items():
+        r = measure(case, engine, warmup=args.warmup, repeat=args.repeat)
+        per_row_us = r["p50_ms"] * 1000 / r["rows"] if r["rows"] else 0.0
+        per_row_bytes = r["peak_mem_kb"] * 1024 / r["rows"] if r["rows"] else 0.0
+        print(
+            f"{name:<14} {r['rows']:>9} rows  p50 {r['p50_ms']:>9.2f} ms  "
+            f"{per_row_us:>7.2f} us/row  {per_row_bytes:>7.0f} B/row peak"
+        )
+
+
+if __name__ == "__main__":
+    main()
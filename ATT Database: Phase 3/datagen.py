@@ -0,0 +1,358 @@
+"""
+Synthetic data generator for the ATT telecom schema.
+
+Produces a referentially consistent customer/account/plan/contract/device/
+invoice dataset at any scale. Output is streamed in chunks of customers
+(each chunk carries that chunk's dependent rows), so memory stays flat
+whether you ask for 10k or 10M customers. The same seed always gives the
+same data.
+
+The rows can be bulk loaded into the ORM schema, turned into ORM objects,
+or written as INSERT statements for the Phase 2 "SQL DDL and DML" schema.
+
+Usage:
+    python datagen.py --customers 1000000 --url postgresql+psycopg2://...
+    python datagen.py --customers 10000 --sql att_10k.sql
+"""
+
+import argparse
+import random
+import string
+from datetime import date, timedelta
+from typing import Dict, Iterator, List
+
+from COMP353_project3 import Account, Contract, Customer, Device, Invoice, Plan, seed_data
+
+DEFAULT_SEED = 353
+DEFAULT_CHUNK_SIZE = 10_000
+AS_OF = date(2024, 12, 1)
+
+# Generated ids are a one letter prefix plus five base-36 digits so they
+# fit the varchar(6) key columns (about 60M ids per table).
+ID_PREFIXES = {
+    "customer": "C",
+    "account": "A",
+    "contract": "T",
+    "device": "D",
+    "invoice": "I",
+}
+ID_DIGITS = 5
+ID_ALPHABET = string.digits + string.ascii_uppercase
+MAX_ID = len(ID_ALPHABET) ** ID_DIGITS
+
+FIRST_NAMES = [
+    "Emma", "Liam", "Ava", "Noah", "Olivia", "Ethan", "Sophia", "Mason", "Isabella",
+    "James", "Mia", "Lucas", "Amelia", "Elijah", "Harper", "Benjamin", "Evelyn",
+    "Henry", "Abigail", "Jack", "Emily", "Daniel", "Ella", "Michael", "Grace",
+]
+LAST_NAMES = [
+    "Johnson", "Smith", "Brown", "Davis", "Miller", "Garcia", "Martinez", "Anderson",
+    "Thomas", "White", "Hernandez", "Lopez", "Wilson", "Moore", "Taylor", "Jackson",
+    "Lee", "Harris", "Clark", "Lewis", "Walker", "Young", "King", "Wright", "Scott",
+]
+STREETS = ["Oak", "Pine", "Maple", "Birch", "Cedar", "Walnut", "Elm", "Poplar", "Spruce",
+           "Hickory", "Willow", "Aspen", "Lake", "Ridge", "Park"]
+STREET_TYPES = ["St", "Ave", "Dr", "Ln", "Rd", "Blvd"]
+CITIES = ["Chicago", "Evanston", "Skokie", "Naperville", "Glenview", "Oak Park",
+          "Des Plaines", "Schaumburg", "Oak Lawn", "Aurora", "Palatine", "Joliet"]
+AREA_CODES = ["312", "773", "847", "630", "224", "708", "331", "815"]
+DEVICE_MODELS = [
+    "iPhone 15 Pro", "iPhone 14", "Samsung Galaxy S24", "Google Pixel 8", "iPad Air",
+    "Samsung Galaxy Tab S9", "Apple Watch Ultra", "Samsung Galaxy Z Flip",
+    "Motorola Edge 50", "OnePlus 12", "Netgear Nighthawk M6",
+]
+
+# (value, weight) tables for the categorical columns.
+ACCOUNTS_PER_CUSTOMER = [(1, 60), (2, 30), (3, 10)]
+ACCOUNT_TYPES = [("Mobile", 50), ("Internet", 30), ("Wireless", 20)]
+ACCOUNT_STATUSES = [("active", 82), ("inactive", 12), ("suspended", 6)]
+DEVICES_PER_ACCOUNT = {
+    "Mobile": [(0, 5), (1, 50), (2, 30), (3, 15)],
+    "Internet": [(0, 40), (1, 60)],
+    "Wireless": [(0, 20), (1, 60), (2, 20)],
+}
+CONTRACT_TERMS_MONTHS = [(12, 70), (24, 30)]
+# Status of the latest invoice vs. older ones.
+LATEST_INVOICE_STATUSES = [("unpaid", 55), ("paid", 40), ("overdue", 5)]
+OLDER_INVOICE_STATUSES = [("paid", 87), ("overdue", 9), ("unpaid", 4)]
+
+
+def _make_id(table: str, n: int) -> str:
+    if n >= MAX_ID:
+        raise ValueError(f"Ran out of {table} ids ({MAX_ID} max)")
+    digits = []
+    for _ in range(ID_DIGITS):
+        n, r = divmod(n, len(ID_ALPHABET))
+        digits.append(ID_ALPHABET[r])
+    return ID_PREFIXES[table] + "".join(reversed(digits))
+
+
+def _pick(rng: random.Random, table):
+    values, weights = zip(*table)
+    return rng.choices(values, weights)[0]
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(day.day, 28))
+
+
+def plan_rows() -> List[dict]:
+    """The plan dimension is the 12 seed plans, shared by every scale."""
+    return [
+        {
+            "PlanID": p.PlanID,
+            "PlanName": p.PlanName,
+            "PlanMonthlyFee": p.PlanMonthlyFee,
+            "PlanDataLimitGB": p.PlanDataLimitGB,
+            "PlanShareable": p.PlanShareable,
+        }
+        for p in seed_data()["plan"]
+    ]
+
+
+# ============================
+#         GENERATOR
+# ============================
+class _Counters:
+    def __init__(self):
+        self.next = {table: 0 for table in ID_PREFIXES}
+
+    def take(self, table: str) -> str:
+        n = self.next[table]
+        self.next[table] = n + 1
+        return _make_id(table, n)
+
+
+def _customer(rng: random.Random, customer_id: str, n: int) -> dict:
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES)
+    return {
+        "CustomerID": customer_id,
+        "CustomerFirstName": first,
+        "CustomerLastName": last,
+        "CustomerEmail": f"{first}.{last}.{n}@example.com".lower(),
+        "CustomerPhoneNumber": rng.choice(AREA_CODES) + f"{rng.randrange(10**7):07d}",
+        "CustomerAddress": (
+            f"{rng.randint(1, 9999)} {rng.choice(STREETS)} {rng.choice(STREET_TYPES)}, "
+            f"{rng.choice(CITIES)} IL"
+        ),
+    }
+
+
+def _balance(rng: random.Random, status: str) -> float:
+    if status == "active":
+        # Right-skewed, median around $65 with a long tail of large balances.
+        return round(rng.lognormvariate(4.2, 0.6), 2)
+    if status == "suspended":
+        return round(rng.lognormvariate(4.8, 0.5), 2)
+    return 0.0 if rng.random() < 0.7 else round(rng.uniform(0, 40), 2)
+
+
+def _account_rows(rng, counters, customer_id, plans, as_of, out):
+    account_id = counters.take("account")
+    account_type = _pick(rng, ACCOUNT_TYPES)
+    status = _pick(rng, ACCOUNT_STATUSES)
+    created = as_of - timedelta(days=rng.randint(30, 3 * 365))
+
+    out["account"].append({
+        "AccountID": account_id,
+        "CustomerID": customer_id,
+        "AccountBalance": _balance(rng, status),
+        "AccountType": account_type,
+        "AccountStatus": status,
+        "AccountCreatedDate": created,
+    })
+
+    # One contract per account; active accounts sometimes also have an
+    # older expired contract on a different plan. The plans always differ,
+    # which keeps the Phase 2 unique (AccountID, PlanID, ContractStatus).
+    contract_status = {"active": "active", "inactive": "expired", "suspended": "canceled"}[status]
+    plan = rng.choices(plans, [p["_weight"] for p in plans])[0]
+    start = created
+    if contract_status == "active" and rng.random() < 0.25:
+        old_plan = rng.choice([p for p in plans if p["PlanID"] != plan["PlanID"]])
+        old_end = _add_months(created, 12)
+        if old_end < as_of:
+            out["contract"].append({
+                "ContractID": counters.take("contract"),
+                "ContractStartDate": created,
+                "ContractEndDate": old_end,
+                "ContractStatus": "expired",
+                "AccountID": account_id,
+                "PlanID": old_plan["PlanID"],
+            })
+            start = old_end
+    term = _pick(rng, CONTRACT_TERMS_MONTHS)
+    out["contract"].append({
+        "ContractID": counters.take("contract"),
+        "ContractStartDate": start,
+        "ContractEndDate": _add_months(start, term),
+        "ContractStatus": contract_status,
+        "AccountID": account_id,
+        "PlanID": plan["PlanID"],
+    })
+
+    for _ in range(_pick(rng, DEVICES_PER_ACCOUNT[account_type])):
+        device_id = counters.take("device")
+        out["device"].append({
+            "DeviceID": device_id,
+            "AccountID": account_id,
+            "DeviceIMEI": f"IMEI{200000000000 + counters.next['device']}",
+            "DeviceModel": rng.choice(DEVICE_MODELS),
+        })
+
+    return account_id, created, plan["PlanMonthlyFee"]
+
+
+def _invoice_rows(rng, counters, account_id, created, fee, months, as_of, out):
+    for back in range(months):
+        invoice_date = _add_months(date(as_of.year, as_of.month, 1), -back - 1)
+        if invoice_date < created:
+            break
+        statuses = LATEST_INVOICE_STATUSES if back == 0 else OLDER_INVOICE_STATUSES
+        out["invoice"].append({
+            "InvoiceID": counters.take("invoice"),
+            "AccountID": account_id,
+            "InvoiceDate": invoice_date,
+            "InvoiceDueDate": invoice_date + timedelta(days=30),
+            "InvoiceAmount": round(fee + max(0.0, rng.gauss(8, 6)), 2),
+            "InvoiceStatus": _pick(rng, statuses),
+        })
+
+
+def generate(
+    customers: int,
+    seed: int = DEFAULT_SEED,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    invoice_months: int = 3,
+    as_of: date = AS_OF,
+) -> Iterator[Dict[str, List[dict]]]:
+    """
+    Yield chunks of {table name: [row dict, ...]} covering `customers`
+    customers. The first chunk also carries the plan table. Every row a
+    chunk references is either in that chunk or in the plan table, so
+    chunks can be loaded one at a time in foreign key order.
+    """
+    rng = random.Random(seed)
+    counters = _Counters()
+    plans = plan_rows()
+    # Cheaper plans are more popular.
+    weighted = [dict(p, _weight=100.0 / p["PlanMonthlyFee"]) for p in plans]
+
+    for chunk_start in range(0, customers, chunk_size):
+        out = {table: [] for table in ("customer", "account", "contract", "device", "invoice")}
+        if chunk_start == 0:
+            out["plan"] = plans
+
+        for n in range(chunk_start, min(chunk_start + chunk_size, customers)):
+            customer_id = counters.take("customer")
+            out["customer"].append(_customer(rng, customer_id, n))
+            for _ in range(_pick(rng, ACCOUNTS_PER_CUSTOMER)):
+                account_id, created, fee = _account_rows(rng, counters, customer_id, weighted, as_of, out)
+                _invoice_rows(rng, counters, account_id, created, fee, invoice_months, as_of, out)
+
+        yield out
+
+
+# ============================
+#           SINKS
+# ============================
+_MODELS = {
+    "customer": Customer,
+    "account": Account,
+    "plan": Plan,
+    "contract": Contract,
+    "device": Device,
+    "invoice": Invoice,
+}
+
+
+def to_orm(chunk: Dict[str, List[dict]]) -> Dict[str, list]:
+    """Turn a generated chunk into ORM instances, e.g. for session.add_all."""
+    return {table: [_MODELS[table](**row) for row in rows] for table, rows in chunk.items()}
+
+
+def load(engine, customers: int, seed: int = DEFAULT_SEED, chunk_size: int = DEFAULT_CHUNK_SIZE,
+         batch_size: int = 10_000, method: str = "auto", **kwargs):
+    """Generate and bulk load straight into the ORM schema, chunk by chunk."""
+    from bulk_load import LoadReport, bulk_load
+
+    report = LoadReport()
+    for chunk in generate(customers, seed=seed, chunk_size=chunk_size, **kwargs):
+        bulk_load(engine, chunk, batch_size=batch_size, method=method, report=report, log=None)
+    print(report)
+    return report
+
+
+# Column order of the Phase 2 INSERT statements.
+PHASE2_COLUMNS = {
+    "customer": ["CustomerID", "CustomerFirstName", "CustomerLastName", "CustomerEmail",
+                 "CustomerPhoneNumber", "CustomerAddress"],
+    "account": ["AccountID", "CustomerID", "AccountBalance", "AccountType", "AccountStatus",
+                "AccountCreatedDate"],
+    "plan": ["PlanID", "PlanName", "PlanMonthlyFee", "PlanDataLimitGB", "PlanShareable"],
+    "contract": ["ContractID", "AccountID", "PlanID", "ContractStartDate", "ContractEndDate",
+                 "ContractStatus"],
+    "invoice": ["InvoiceID", "AccountID", "InvoiceDate", "InvoiceDueDate", "InvoiceAmount",
+                "InvoiceStatus"],
+    "device": ["DeviceID", "AccountID", "DeviceIMEI", "DeviceModel"],
+}
+
+
+def _sql_literal(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def write_sql(chunks, fp, rows_per_statement: int = 1000) -> None:
+    """Write chunks as Phase 2 style multi-row INSERT statements."""
+    for chunk in chunks:
+        for table, columns in PHASE2_COLUMNS.items():
+            rows = chunk.get(table, [])
+            for i in range(0, len(rows), rows_per_statement):
+                fp.write(f"Insert into {table.upper()} ({', '.join(columns)})\nvalues\n")
+                fp.write(",\n".join(
+                    "(" + ",".join(_sql_literal(row[c]) for c in columns) + ")"
+                    for row in rows[i:i + rows_per_statement]
+                ))
+                fp.write(";\n\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic ATT data")
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--invoice-months", type=int, default=3)
+    parser.add_argument("--url", help="SQLAlchemy URL to bulk load into (ORM schema)")
+    parser.add_argument("--sql", help="write Phase 2 INSERT statements to this file")
+    args = parser.parse_args()
+
+    if not args.url and not args.sql:
+        parser.error("give --url and/or --sql")
+
+    if args.url:
+        from COMP353_project3 import create_schema
+        from database import EngineConfig, make_engine
+
+        engine = make_engine(EngineConfig(url=args.url))
+        create_schema(engine)
+        load(engine, args.customers, seed=args.seed, chunk_size=args.chunk_size,
+             invoice_months=args.invoice_months)
+
+    if args.sql:
+        with open(args.sql, "w") as fp:
+            write_sql(generate(args.customers, seed=args.seed, chunk_size=args.chunk_size,
+                               invoice_months=args.invoice_months), fp)
+
+
+if __name__ == "__main__":
+    main()
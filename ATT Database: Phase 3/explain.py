@@ -0,0 +1,114 @@
+"""
+EXPLAIN-based check that the reports are served by the declared indexes.
+
+For every report, the plan is fetched (EXPLAIN on PostgreSQL, EXPLAIN QUERY
+PLAN on SQLite) and every table listed in EXPECTED_INDEX_ACCESS for that
+report must be read through an index, not a sequential / full table scan.
+Tables a report reads in full on purpose (e.g. customer in Query 1, which
+returns nearly every customer) are left out of the expectations.
+
+Usage:
+    python explain.py --url postgresql+psycopg2://... --customers 1000000 --load
+    python explain.py --url sqlite:///att.db
+"""
+
+import argparse
+import re
+import sys
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from COMP353_project3 import REPORTS, Base, create_schema
+from database import EngineConfig, make_engine
+
+EXPECTED_INDEX_ACCESS = {
+    "q1_active_contract_customers": ["contract"],
+    "q1_active_customers_semijoin": ["account", "contract"],
+    "q2_top_active_balances": ["account"],
+    "q3_underfunded_active_contracts": ["contract"],
+    "q4_active_devices_summary": ["contract", "device"],
+    "q5_invoice_payment_summary": ["invoice"],
+    "q6_contracts_expiring_30d": ["contract"],
+}
+
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+# Partitions of a partitioned table (partitioning.py): invoice_y2026m11, invoice_default.
+_PG_PARTITION = re.compile(r"^(\w+?)_(?:y\d{4}m\d{2}|default)$")
+_SQLITE_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def explain(engine, stmt, analyze: bool = False) -> List[str]:
+    """Return the plan of `stmt` as a list of text lines."""
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        return [row[0] for row in conn.exec_driver_sql(prefix + sql)]
+
+
+def full_scans(engine, plan: List[str]) -> List[str]:
+    """Tables the plan reads with a sequential / full table scan; partitions count as their table."""
+    pattern = _SQLITE_FULL_SCAN if engine.dialect.name == "sqlite" else _PG_SEQ_SCAN
+    tables = []
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match:
+            partition = _PG_PARTITION.match(match.group(1))
+            tables.append(partition.group(1) if partition else match.group(1))
+    return tables
+
+
+def analyze_tables(engine) -> None:
+    """Refresh planner statistics; plans on a freshly loaded db are meaningless without them."""
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+        else:
+            for table in Base.metadata.sorted_tables:
+                conn.execute(text(f"ANALYZE {conn.dialect.identifier_preparer.format_table(table)}"))
+
+
+def check_index_usage(engine, expected: Dict[str, List[str]] = EXPECTED_INDEX_ACCESS,
+                      verbose: bool = True) -> Dict[str, List[str]]:
+    """
+    Return {report: [tables scanned in full that should use an index]}.
+    An empty dict means every report uses its indexes.
+    """
+    failures = {}
+    for name, tables in expected.items():
+        plan = explain(engine, REPORTS[name]())
+        bad = sorted(set(full_scans(engine, plan)) & set(tables))
+        if bad:
+            failures[name] = bad
+        if verbose:
+            print(f"{'FAIL' if bad else 'ok':<5} {name}" + (f"  (full scan: {', '.join(bad)})" if bad else ""))
+            for line in plan:
+                print(f"        {line}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the reports use index scans")
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--load", action="store_true",
+                        help="drop and rebuild the ATT tables with datagen first")
+    args = parser.parse_args()
+
+    engine = make_engine(EngineConfig(url=args.url))
+    if args.load:
+        import datagen
+
+        Base.metadata.drop_all(engine)
+        create_schema(engine)
+        datagen.load(engine, args.customers)
+    analyze_tables(engine)
+
+    failures = check_index_usage(engine)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Statement-level instrumentation for the ATT engine and ORM sessions.
+
+Once attached, every statement run on the engine is timed at the cursor
+(before/after_cursor_execute) and aggregated per statement fingerprint:
+calls, total and max latency, a latency histogram, and rows (DML
+rowcount, or the number of rows an ORM query returned). Also recorded:
+
+  * pool checkouts     - connections handed out by the pool, and the time
+                         spent waiting for one (Engine.raw_connection(),
+                         minus any time opening a new connection)
+  * pool connects      - new DBAPI connections opened, and the time spent
+                         opening them (do_connect to the pool's connect
+                         event)
+  * ORM load time      - fetch + object/row hydration of ORM queries, i.e.
+                         session.execute() time minus cursor execute time
+
+Statements slower than `slow_ms` go to the "att.slow_query" logger as one
+JSON record each, optionally with the statement's plan (EXPLAIN (ANALYZE,
+BUFFERS) on PostgreSQL, EXPLAIN QUERY PLAN on SQLite; SELECTs only, since
+ANALYZE runs the statement again).
+
+Everything can be exported with to_json() or as Prometheus text with
+to_prometheus().
+
+Usage:
+    metrics = Instrumentation(slow_ms=200, explain_slow=True)
+    metrics.attach(engine)
+    ...
+    print(metrics.to_prometheus())
+
+    python instrumentation.py --slow-ms 50 --explain --format prometheus
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+slow_log = logging.getLogger("att.slow_query")
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(_WHITESPACE.sub(" ", statement).strip().encode()).hexdigest()[:12]
+
+
+def _is_query(statement: str) -> bool:
+    words = statement.split(None, 1)
+    return bool(words) and words[0].upper() in ("SELECT", "WITH")
+
+
+@dataclass
+class StatementStats:
+    statement: str
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    rows: int = 0
+    slow: int = 0
+    buckets: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+
+    def observe(self, seconds: float) -> None:
+        self.calls += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class Instrumentation:
+    def __init__(self, slow_ms: Optional[float] = 500.0, explain_slow: bool = False):
+        self.slow_ms = slow_ms
+        self.explain_slow = explain_slow
+        self.statements: Dict[str, StatementStats] = {}
+        self.checkouts = 0
+        self.checkout_wait_seconds = 0.0
+        self.checkout_wait_max = 0.0
+        self.connects = 0
+        self.connect_seconds = 0.0
+        self.orm_loads = 0
+        self.orm_load_seconds = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._engines = []
+        self._raw_connections = {}
+        self._sessions = []
+
+    # ---------- cursor ----------
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("instrumentation_start", []).append((context, time.perf_counter()))
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["instrumentation_start"].pop()[1]
+        self._local.cursor_seconds = getattr(self._local, "cursor_seconds", 0.0) + seconds
+        key = fingerprint(statement)
+        is_dml = context is not None and (context.isinsert or context.isupdate or context.isdelete)
+        rowcount = cursor.rowcount if is_dml else -1
+        slow = self.slow_ms is not None and seconds * 1000 >= self.slow_ms
+
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = StatementStats(statement)
+            stats.observe(seconds)
+            if rowcount > 0:
+                stats.rows += rowcount
+            if slow:
+                stats.slow += 1
+        self._local.last_key = key
+
+        if slow:
+            record = {
+                "event": "slow_query",
+                "fingerprint": key,
+                "ms": round(seconds * 1000, 3),
+                "statement": statement,
+                "parameters": repr(parameters)[:500],
+            }
+            if self.explain_slow and not executemany and _is_query(statement):
+                record["plan"] = self._explain(conn, cursor, statement, parameters)
+            slow_log.warning(json.dumps(record))
+
+    def _handle_error(self, exception_context) -> None:
+        # after_cursor_execute does not fire when the cursor raises; drop the
+        # start time pushed for the failed statement so the next pop is its own.
+        # Errors raised before before_cursor_execute pushed nothing, hence the
+        # check that the top entry is this statement's.
+        conn = exception_context.connection
+        starts = conn.info.get("instrumentation_start") if conn is not None else None
+        if starts and starts[-1][0] is exception_context.execution_context:
+            starts.pop()
+
+    @staticmethod
+    def _explain(conn, cursor, statement, parameters) -> List[str]:
+        # A fresh DBAPI cursor, so no engine events fire for the EXPLAIN itself.
+        if conn.dialect.name == "postgresql":
+            prefix, column = "EXPLAIN (ANALYZE, BUFFERS) ", 0
+        elif conn.dialect.name == "sqlite":
+            prefix, column = "EXPLAIN QUERY PLAN ", -1
+        else:
+            return []
+        plan_cursor = cursor.connection.cursor()
+        try:
+            plan_cursor.execute(prefix + statement, parameters)
+            return [str(row[column]) for row in plan_cursor.fetchall()]
+        except Exception as exc:
+            return [f"EXPLAIN failed: {exc}"]
+        finally:
+            plan_cursor.close()
+
+    # ---------- pool ----------
+    # Pool events, not a wrapped pool.connect(): listeners set on the engine
+    # are carried over to the new pool when engine.dispose() replaces it.
+    def _do_connect(self, dialect, conn_rec, cargs, cparams) -> None:
+        self._local.connect_start = time.perf_counter()
+
+    def _connect(self, dbapi_connection, connection_record) -> None:
+        start = getattr(self._local, "connect_start", None)
+        self._local.connect_start = None
+        seconds = time.perf_counter() - start if start is not None else 0.0
+        self._local.connect_seconds = getattr(self._local, "connect_seconds", 0.0) + seconds
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds += seconds
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    # The pool has no event before a checkout starts, so the wait is timed
+    # around Engine.raw_connection(), which every Connection goes through.
+    # Wrapped on the engine, not the pool, for the same reason as above.
+    def _timed_raw_connection(self, raw_connection):
+        def raw_connection_timed():
+            connect_before = getattr(self._local, "connect_seconds", 0.0)
+            start = time.perf_counter()
+            try:
+                return raw_connection()
+            finally:
+                connecting = getattr(self._local, "connect_seconds", 0.0) - connect_before
+                wait = max(time.perf_counter() - start - connecting, 0.0)
+                with self._lock:
+                    self.checkout_wait_seconds += wait
+                    self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+        return raw_connection_timed
+
+    _ENGINE_EVENTS = (
+        ("before_cursor_execute", "_before_cursor_execute"),
+        ("after_cursor_execute", "_after_cursor_execute"),
+        ("handle_error", "_handle_error"),
+        ("do_connect", "_do_connect"),
+        ("connect", "_connect"),
+        ("checkout", "_checkout"),
+    )
+
+    # ---------- ORM ----------
+    def _do_orm_execute(self, orm_execute_state) -> Optional[object]:
+        options = orm_execute_state.execution_options
+        if not orm_execute_state.is_select or options.get("yield_per") or options.get("stream_results"):
+            return None  # streamed results are consumed later, outside this hook; never buffer them
+        cursor_before = getattr(self._local, "cursor_seconds", 0.0)
+        start = time.perf_counter()
+        frozen = orm_execute_state.invoke_statement().freeze()
+        rows = len(frozen.data)
+        load = (time.perf_counter() - start) - (self._local.cursor_seconds - cursor_before)
+        with self._lock:
+            self.orm_loads += 1
+            self.orm_load_seconds += max(load, 0.0)
+            stats = self.statements.get(getattr(self._local, "last_key", None))
+            if stats is not None:
+                stats.rows += rows
+        return frozen()
+
+    # ---------- attach ----------
+    def attach(self, engine, session_target=Session) -> None:
+        for name, method in self._ENGINE_EVENTS:
+            event.listen(engine, name, getattr(self, method))
+        if isinstance(engine, Engine) and id(engine) not in self._raw_connections:
+            self._raw_connections[id(engine)] = engine.raw_connection
+            engine.raw_connection = self._timed_raw_connection(engine.raw_connection)
+        self._engines.append(engine)
+        if session_target is not None:
+            event.listen(session_target, "do_orm_execute", self._do_orm_execute)
+            self._sessions.append(session_target)
+
+    def detach(self) -> None:
+        for engine in self._engines:
+            for name, method in self._ENGINE_EVENTS:
+                event.remove(engine, name, getattr(self, method))
+            if id(engine) in self._raw_connections:
+                del engine.raw_connection
+                self._raw_connections.pop(id(engine))
+        for target in self._sessions:
+            event.remove(target, "do_orm_execute", self._do_orm_execute)
+        self._engines.clear()
+        self._sessions.clear()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.statements.clear()
+            self.checkouts = self.connects = self.orm_loads = 0
+            self.connect_seconds = self.orm_load_seconds = 0.0
+            self.checkout_wait_seconds = self.checkout_wait_max = 0.0
+
+    # ============================
+    #           EXPORT
+    # ============================
+    def to_json(self) -> dict:
+        with self._lock:
+            return {
+                "pool": {"checkouts": self.checkouts,
+                         "checkout_wait_seconds": self.checkout_wait_seconds,
+                         "checkout_wait_max": self.checkout_wait_max,
+                         "connects": self.connects, "connect_seconds": self.connect_seconds},
+                "orm": {"loads": self.orm_loads, "load_seconds": self.orm_load_seconds},
+                "statements": [
+                    {
+                        "fingerprint": key,
+                        "statement": _WHITESPACE.sub(" ", s.statement).strip(),
+                        "calls": s.calls,
+                        "seconds": s.seconds,
+                        "max_seconds": s.max_seconds,
+                        "rows": s.rows,
+                        "slow": s.slow,
+                    }
+                    for key, s in sorted(self.statements.items(), key=lambda kv: -kv[1].seconds)
+                ],
+            }
+
+    def to_prometheus(self, prefix: str = "att") -> str:
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+                lines.append(f"{prefix}_{name}{label_text} {value}")
+
+        with self._lock:
+            stats = sorted(self.statements.items())
+            metric("sql_statements_total", "counter", "Statements executed",
+                   [({"fingerprint": k}, s.calls) for k, s in stats])
+            metric("sql_seconds_total", "counter", "Cursor execute time",
+                   [({"fingerprint": k}, s.seconds) for k, s in stats])
+            metric("sql_rows_total", "counter", "Rows returned to the ORM or affected by DML",
+                   [({"fingerprint": k}, s.rows) for k, s in stats])
+            metric("sql_slow_total", "counter", "Statements over the slow-query threshold",
+                   [({"fingerprint": k}, s.slow) for k, s in stats])
+
+            lines.append(f"# HELP {prefix}_sql_duration_seconds Cursor execute latency")
+            lines.append(f"# TYPE {prefix}_sql_duration_seconds histogram")
+            for k, s in stats:
+                running = 0
+                for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                    running += count
+                    lines.append(f'{prefix}_sql_duration_seconds_bucket{{fingerprint="{k}",le="{bound}"}} {running}')
+                lines.append(f'{prefix}_sql_duration_seconds_bucket{{fingerprint="{k}",le="+Inf"}} {s.calls}')
+                lines.append(f'{prefix}_sql_duration_seconds_sum{{fingerprint="{k}"}} {s.seconds}')
+                lines.append(f'{prefix}_sql_duration_seconds_count{{fingerprint="{k}"}} {s.calls}')
+
+            metric("pool_checkouts_total", "counter", "Pool checkouts", [({}, self.checkouts)])
+            metric("pool_checkout_wait_seconds_total", "counter", "Time waiting for a pooled connection",
+                   [({}, self.checkout_wait_seconds)])
+            metric("pool_connects_total", "counter", "New DBAPI connections", [({}, self.connects)])
+            metric("pool_connect_seconds_total", "counter", "Time opening new DBAPI connections",
+                   [({}, self.connect_seconds)])
+            metric("orm_loads_total", "counter", "ORM SELECT executions", [({}, self.orm_loads)])
+            metric("orm_load_seconds_total", "counter", "ORM fetch and hydration time",
+                   [({}, self.orm_load_seconds)])
+        return "\n".join(lines) + "\n"
+
+
+def main():
+    from COMP353_project3 import REPORTS
+    from database import get_engine, get_session
+
+    parser = argparse.ArgumentParser(description="Run the reports with instrumentation attached")
+    parser.add_argument("--slow-ms", type=float, default=100.0)
+    parser.add_argument("--explain", action="store_true", help="capture plans of slow statements")
+    parser.add_argument("--format", choices=("json", "prometheus"), default="json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(name)s %(message)s")
+    metrics = Instrumentation(slow_ms=args.slow_ms, explain_slow=args.explain)
+    metrics.attach(get_engine())
+    try:
+        for builder in REPORTS.values():
+            with get_session() as session:
+                session.execute(builder()).all()
+    finally:
+        metrics.detach()
+
+    if args.format == "json":
+        print(json.dumps(metrics.to_json(), indent=2))
+    else:
+        print(metrics.to_prometheus(), end="")
+
+
+if __name__ == "__main__":
+    main()
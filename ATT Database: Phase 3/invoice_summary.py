@@ -0,0 +1,271 @@
+"""
+Maintained per-account invoice summary (the Query 5 numbers).
+
+invoice_account_summary holds, per AccountID, the invoice count, total,
+paid and unpaid amounts and the overdue count. It is kept current in one of
+two ways, not both:
+
+  * enable_incremental_refresh() - ORM flush hooks. Every flush that
+    inserts, updates or deletes Invoice objects applies the per-account
+    delta with one upsert, in the same transaction. The old values of
+    updated and deleted invoices are read in before_flush, while the
+    database still has them (an object expired by a commit has no history
+    of its own), and the tracked columns are active_history on the model.
+  * install_triggers(engine) - PostgreSQL statement triggers with
+    transition tables, for writes that bypass the ORM (bulk_load, COPY,
+    set-based billing runs).
+
+refresh_invoice_summary() recomputes it from scratch, or for a set of
+accounts, e.g. after a bulk load.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, event, func, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from COMP353_project3 import Invoice, InvoiceAccountSummary
+
+SUMMARY = InvoiceAccountSummary.__table__
+DELTA_COLUMNS = (
+    "NumInvoices",
+    "TotalInvoiceAmount",
+    "TotalPaidAmount",
+    "TotalUnpaidAmount",
+    "NumOverdueInvoices",
+)
+REFRESH_BATCH_SIZE = 1000
+
+
+def dialect_insert(conn):
+    """The dialect's INSERT construct with on_conflict_do_update support."""
+    name = conn.dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"No upsert support for {name}")
+    return dialect_insert
+
+
+# ============================
+#        FULL REFRESH
+# ============================
+def _aggregate():
+    return select(
+        Invoice.AccountID,
+        func.count(),
+        func.sum(Invoice.InvoiceAmount),
+        func.sum(case((Invoice.InvoiceStatus == "paid", Invoice.InvoiceAmount), else_=0)),
+        func.sum(case((Invoice.InvoiceStatus == "unpaid", Invoice.InvoiceAmount), else_=0)),
+        func.sum(case((Invoice.InvoiceStatus == "overdue", 1), else_=0)),
+    ).group_by(Invoice.AccountID)
+
+
+def refresh_invoice_summary(conn, account_ids: Optional[Iterable[str]] = None) -> None:
+    """Recompute the summary for every account, or only for `account_ids`."""
+    columns = ["AccountID", *DELTA_COLUMNS]
+    if account_ids is None:
+        conn.execute(delete(SUMMARY))
+        conn.execute(insert(SUMMARY).from_select(columns, _aggregate()))
+        return
+
+    account_ids = sorted(set(account_ids))
+    for i in range(0, len(account_ids), REFRESH_BATCH_SIZE):
+        batch = account_ids[i:i + REFRESH_BATCH_SIZE]
+        conn.execute(delete(SUMMARY).where(SUMMARY.c.AccountID.in_(batch)))
+        conn.execute(insert(SUMMARY).from_select(
+            columns, _aggregate().where(Invoice.AccountID.in_(batch))
+        ))
+
+
+# ============================
+#     INCREMENTAL (ORM)
+# ============================
+def apply_deltas(conn, deltas: Dict[str, Dict[str, float]]) -> None:
+    """Add per-account deltas to the summary, creating missing rows."""
+    if not deltas:
+        return
+    ins = dialect_insert(conn)(SUMMARY)
+    stmt = ins.on_conflict_do_update(
+        index_elements=[SUMMARY.c.AccountID],
+        set_={c: SUMMARY.c[c] + ins.excluded[c] for c in DELTA_COLUMNS},
+    )
+    rows = [
+        {"AccountID": account_id, **{c: delta.get(c, 0) for c in DELTA_COLUMNS}}
+        for account_id, delta in deltas.items()
+    ]
+    conn.execute(stmt, rows)
+
+
+def _add(deltas, account_id, amount, status, sign) -> None:
+    delta = deltas[account_id]
+    delta["NumInvoices"] += sign
+    delta["TotalInvoiceAmount"] += sign * amount
+    if status == "paid":
+        delta["TotalPaidAmount"] += sign * amount
+    elif status == "unpaid":
+        delta["TotalUnpaidAmount"] += sign * amount
+    elif status == "overdue":
+        delta["NumOverdueInvoices"] += sign
+
+
+_TRACKED = ("AccountID", "InvoiceAmount", "InvoiceStatus")
+_OLD_VALUES_KEY = "invoice_summary_old_values"
+
+
+def _old_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    # Expired and untouched: loads it, which is only right before the flush.
+    return state.attrs[key].value
+
+
+def old_values(session) -> Dict[object, tuple]:
+    """(AccountID, InvoiceAmount, InvoiceStatus) as stored, per updated or deleted Invoice state."""
+    old = {}
+    for obj in (*session.deleted, *session.dirty):
+        if isinstance(obj, Invoice):
+            state = inspect(obj)
+            if state.has_identity:
+                old[state] = tuple(_old_value(state, k) for k in _TRACKED)
+    return old
+
+
+def invoice_deltas(session, old: Optional[Dict[object, tuple]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Summary deltas for the Invoice changes pending in `session`'s flush.
+    `old` is old_values() taken before the flush; without it old values
+    come from attribute history.
+    """
+    old = {} if old is None else old
+    deltas = defaultdict(lambda: defaultdict(float))
+
+    def previous(state):
+        if state in old:
+            return old[state]
+        return tuple(_old_value(state, k) for k in _TRACKED)
+
+    for obj in session.new:
+        if isinstance(obj, Invoice):
+            _add(deltas, obj.AccountID, obj.InvoiceAmount, obj.InvoiceStatus, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Invoice):
+            _add(deltas, *previous(inspect(obj)), -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Invoice):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[k].history.has_changes() for k in _TRACKED):
+            continue
+        _add(deltas, *previous(state), -1)
+        _add(deltas, obj.AccountID, obj.InvoiceAmount, obj.InvoiceStatus, 1)
+
+    return {k: dict(v) for k, v in deltas.items() if any(v.values())}
+
+
+def _before_flush(session, flush_context, instances) -> None:
+    session.info[_OLD_VALUES_KEY] = old_values(session)
+
+
+def _after_flush(session, flush_context) -> None:
+    # new/dirty/deleted and attribute history still show the pre-flush
+    # state here, and we are inside the flush's transaction.
+    old = session.info.pop(_OLD_VALUES_KEY, None)
+    apply_deltas(session.connection(), invoice_deltas(session, old))
+
+
+_EVENTS = (("before_flush", _before_flush), ("after_flush", _after_flush))
+
+
+def enable_incremental_refresh(target=Session) -> None:
+    """Maintain the summary on every flush of `target` (a Session class or instance)."""
+    for name, fn in _EVENTS:
+        if not event.contains(target, name, fn):
+            event.listen(target, name, fn)
+
+
+def disable_incremental_refresh(target=Session) -> None:
+    for name, fn in _EVENTS:
+        if event.contains(target, name, fn):
+            event.remove(target, name, fn)
+
+
+# ============================
+#    POSTGRESQL TRIGGERS
+# ============================
+def _delta_sql(source: str, sign: int) -> str:
+    return f"""
+    INSERT INTO invoice_account_summary AS s
+        ("AccountID", "NumInvoices", "TotalInvoiceAmount", "TotalPaidAmount",
+         "TotalUnpaidAmount", "NumOverdueInvoices")
+    SELECT "AccountID",
+           {sign} * count(*),
+           {sign} * sum("InvoiceAmount"),
+           {sign} * sum(CASE WHEN "InvoiceStatus" = 'paid' THEN "InvoiceAmount" ELSE 0 END),
+           {sign} * sum(CASE WHEN "InvoiceStatus" = 'unpaid' THEN "InvoiceAmount" ELSE 0 END),
+           {sign} * sum(CASE WHEN "InvoiceStatus" = 'overdue' THEN 1 ELSE 0 END)
+    FROM {source}
+    GROUP BY "AccountID"
+    ON CONFLICT ("AccountID") DO UPDATE SET
+        "NumInvoices" = s."NumInvoices" + EXCLUDED."NumInvoices",
+        "TotalInvoiceAmount" = s."TotalInvoiceAmount" + EXCLUDED."TotalInvoiceAmount",
+        "TotalPaidAmount" = s."TotalPaidAmount" + EXCLUDED."TotalPaidAmount",
+        "TotalUnpaidAmount" = s."TotalUnpaidAmount" + EXCLUDED."TotalUnpaidAmount",
+        "NumOverdueInvoices" = s."NumOverdueInvoices" + EXCLUDED."NumOverdueInvoices";"""
+
+
+TRIGGER_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION invoice_summary_maintain() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN{_delta_sql("old_rows", -1)}
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN{_delta_sql("new_rows", 1)}
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# Transition tables only allow one event per trigger, hence three of them.
+TRIGGERS_SQL = [
+    """CREATE TRIGGER invoice_summary_insert AFTER INSERT ON invoice
+       REFERENCING NEW TABLE AS new_rows
+       FOR EACH STATEMENT EXECUTE FUNCTION invoice_summary_maintain()""",
+    """CREATE TRIGGER invoice_summary_update AFTER UPDATE ON invoice
+       REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+       FOR EACH STATEMENT EXECUTE FUNCTION invoice_summary_maintain()""",
+    """CREATE TRIGGER invoice_summary_delete AFTER DELETE ON invoice
+       REFERENCING OLD TABLE AS old_rows
+       FOR EACH STATEMENT EXECUTE FUNCTION invoice_summary_maintain()""",
+]
+
+
+def install_triggers(engine) -> None:
+    if engine.dialect.name != "postgresql":
+        raise NotImplementedError("Summary triggers are PostgreSQL only")
+    with engine.begin() as conn:
+        drop_triggers(conn)
+        conn.exec_driver_sql(TRIGGER_FUNCTION_SQL)
+        for sql in TRIGGERS_SQL:
+            conn.exec_driver_sql(sql)
+
+
+def drop_triggers(conn) -> None:
+    for name in ("invoice_summary_insert", "invoice_summary_update", "invoice_summary_delete"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name} ON invoice")
+
+
+# ============================
+#          READS
+# ============================
+def account_billing_totals(session, account_id: str) -> Optional[InvoiceAccountSummary]:
+    """One account's totals by primary key lookup."""
+    return session.get(InvoiceAccountSummary, account_id)
@@ -0,0 +1,211 @@
+"""
+Schema migrations for databases created before a model change.
+
+create_schema() only creates missing tables, so columns whose type changed
+in the model have to be converted in place here.
+
+    migrate_contract_dates   contract.ContractStartDate / ContractEndDate
+                             from varchar(30) to date, stray quotes and
+                             blanks cleaned up first, then the renewal
+                             index ix_contract_active_end is built
+    recreate_index           drop and re-create an index whose stored
+                             definition differs from the model
+                             (ix_account_active_balance gained AccountID
+                             DESC for keyset pagination)
+    create_index             build an index added to an existing table
+                             (ix_invoice_unpaid_due for the sweeper, and
+                             REPORT_INDEXES: the report indexes and the
+                             foreign key indexes)
+    widen_invoice_id         invoice.InvoiceID from varchar(6) to
+                             varchar(20) for billing run ids
+
+Usage:
+    python migrations.py --url postgresql+psycopg2://...
+"""
+
+import argparse
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Date, inspect, text
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql import operators
+
+from COMP353_project3 import Account, Contract, Device, Invoice
+from database import EngineConfig, make_engine
+
+CONTRACT_DATE_COLUMNS = ("ContractStartDate", "ContractEndDate")
+
+# Indexes the reports rely on, built on databases that predate them. The
+# single-column ones are the foreign key indexes (index=True in the model).
+REPORT_INDEXES = (
+    (Account.__table__, "ix_account_CustomerID"),
+    (Account.__table__, "ix_account_status_customer"),
+    (Contract.__table__, "ix_contract_AccountID"),
+    (Contract.__table__, "ix_contract_PlanID"),
+    (Contract.__table__, "ix_contract_active_account"),
+    (Contract.__table__, "ix_contract_status_account"),
+    (Device.__table__, "ix_device_AccountID"),
+    (Invoice.__table__, "ix_invoice_account_status"),
+)
+
+# Characters stripped from both ends of a stored date ("'2024-03-22").
+_STRIP = " '"
+
+
+def untyped_date_columns(conn) -> List[str]:
+    """
+    Contract date columns still stored as text. On PostgreSQL that is the
+    ones not yet of type date; SQLite keeps dates as text under any
+    declared type, so there it is all of them.
+    """
+    if conn.dialect.name != "postgresql":
+        return list(CONTRACT_DATE_COLUMNS)
+    columns = {c["name"]: c["type"] for c in inspect(conn).get_columns("contract")}
+    return [c for c in CONTRACT_DATE_COLUMNS if not isinstance(columns[c], Date)]
+
+
+def bad_contract_dates(conn, columns: Optional[List[str]] = None) -> List[Tuple[str, str, str]]:
+    """
+    (ContractID, column, value) for every stored date that does not parse
+    after cleanup, in `columns` (default: untyped_date_columns()).
+    """
+    bad = []
+    for column in untyped_date_columns(conn) if columns is None else columns:
+        if conn.dialect.name == "postgresql":
+            # CASE, so the casts only run on values of the right shape; the
+            # day is checked against the month's real length (no 2024-02-30).
+            value = f'btrim("{column}", :strip)'
+            year, month, day = (f"substr({value}, {i}, {n})::int" for i, n in ((1, 4), (6, 2), (9, 2)))
+            check = f"""CASE
+                WHEN {value} !~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}$' THEN true
+                WHEN {year} < 1 OR {month} NOT BETWEEN 1 AND 12 THEN true
+                ELSE {day} NOT BETWEEN 1 AND extract(day FROM make_date({year}, {month}, 1)
+                                                     + interval '1 month - 1 day')
+            END"""
+        else:
+            check = f"""date(trim("{column}", :strip)) IS NOT trim("{column}", :strip)"""
+        rows = conn.execute(
+            text(f"""SELECT "ContractID", "{column}" FROM contract
+                     WHERE "{column}" IS NOT NULL AND trim("{column}", :strip) <> '' AND {check}"""),
+            {"strip": _STRIP},
+        )
+        bad.extend((contract_id, column, value) for contract_id, value in rows)
+    return bad
+
+
+def migrate_contract_dates(engine) -> bool:
+    """Convert the contract date columns to date; returns False if nothing changed."""
+    changed = False
+    with engine.begin() as conn:
+        # Columns already of type date (create_schema(), or a previous run)
+        # are skipped: btrim() and friends do not take a date on PostgreSQL.
+        untyped = untyped_date_columns(conn)
+        bad = bad_contract_dates(conn, untyped)
+        if bad:
+            raise ValueError(f"Unparseable contract dates, fix these first: {bad}")
+
+        if engine.dialect.name == "postgresql":
+            if untyped:
+                conn.execute(text(
+                    "ALTER TABLE contract "
+                    + ", ".join(
+                        f"""ALTER COLUMN "{c}" TYPE date USING NULLIF(btrim("{c}", :strip), '')::date"""
+                        for c in untyped
+                    )
+                ), {"strip": _STRIP})
+                changed = True
+        else:
+            # SQLite keeps dates as ISO text under any declared type, so
+            # cleaning up the values is all the Date type needs.
+            for c in untyped:
+                result = conn.execute(text(
+                    f"""UPDATE contract SET "{c}" = NULLIF(trim("{c}", :strip), '')
+                        WHERE "{c}" <> trim("{c}", :strip) OR "{c}" = ''"""
+                ), {"strip": _STRIP})
+                changed = changed or result.rowcount > 0
+
+    create_index(engine, Contract.__table__, "ix_contract_active_end")
+    return changed
+
+
+def widen_invoice_id(engine) -> bool:
+    """Widen invoice.InvoiceID to the model length; returns False if nothing changed."""
+    # SQLite does not enforce varchar lengths, so only PostgreSQL needs it.
+    if engine.dialect.name != "postgresql":
+        return False
+    length = Invoice.__table__.c.InvoiceID.type.length
+    with engine.begin() as conn:
+        columns = {c["name"]: c["type"] for c in inspect(conn).get_columns("invoice")}
+        if (columns["InvoiceID"].length or 0) >= length:
+            return False
+        conn.execute(text(f'ALTER TABLE invoice ALTER COLUMN "InvoiceID" TYPE varchar({length})'))
+    return True
+
+
+def create_index(engine, table, name: str) -> None:
+    index = next(i for i in table.indexes if i.name == name)
+    index.create(engine, checkfirst=True)
+
+
+def index_matches(conn, index) -> bool:
+    """Whether `index` exists with the model's definition."""
+    if conn.dialect.name == "sqlite":
+        # SQLite keeps the CREATE INDEX statement as it was issued.
+        stored = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = :name"), {"name": index.name}
+        ).scalar()
+        expected = str(CreateIndex(index).compile(dialect=conn.dialect))
+        return stored is not None and " ".join(stored.split()) == " ".join(expected.split())
+    reflected = next((i for i in inspect(conn).get_indexes(index.table.name) if i["name"] == index.name), None)
+    if reflected is None:
+        return False
+    descending = {
+        c.name for c, e in zip(index.columns, index.expressions)
+        if getattr(e, "modifier", None) is operators.desc_op
+    }
+    sorting = {c for c, s in reflected.get("column_sorting", {}).items() if "desc" in s}
+    include = index.dialect_options["postgresql"]["include"] or []
+    return (
+        reflected["column_names"] == [c.name for c in index.columns]
+        and sorting == descending
+        and list(reflected.get("include_columns") or []) == list(include)
+    )
+
+
+def recreate_index(engine, table, name: str) -> bool:
+    """Drop and re-create index `name` unless it already matches the model; returns False if it did."""
+    index = next(i for i in table.indexes if i.name == name)
+    with engine.begin() as conn:
+        if index_matches(conn, index):
+            return False
+        index.drop(conn, checkfirst=True)
+        index.create(conn)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate an existing ATT database to the current model")
+    parser.add_argument("--url", help="SQLAlchemy URL (defaults to ATT_DATABASE_URL)")
+    args = parser.parse_args()
+
+    config = EngineConfig.from_env()
+    if args.url:
+        config.url = args.url
+    engine = make_engine(config)
+    changed = migrate_contract_dates(engine)
+    print("contract dates migrated" if changed else "contract dates already clean")
+    if recreate_index(engine, Account.__table__, "ix_account_active_balance"):
+        print("rebuilt ix_account_active_balance")
+    else:
+        print("ix_account_active_balance already current")
+    create_index(engine, Invoice.__table__, "ix_invoice_unpaid_due")
+    print("ix_invoice_unpaid_due in place")
+    for table, name in REPORT_INDEXES:
+        create_index(engine, table, name)
+    print(f"{len(REPORT_INDEXES)} report and foreign key indexes in place")
+    if widen_invoice_id(engine):
+        print("widened invoice.InvoiceID")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Keyset (seek) pagination for the top-balance report (Query 2).
+
+Pages are ordered by (AccountBalance DESC, AccountID DESC). Instead of an
+OFFSET, every page after the first starts strictly below the last row of
+the previous page:
+
+    WHERE (AccountBalance, AccountID) < (:last_balance, :last_account)
+
+That is a range seek on ix_account_active_balance, so page 1000 costs the
+same as page 1. The position is handed to clients as an opaque cursor
+string (url-safe base64 of the key), so they cannot depend on its format.
+
+Usage:
+    page = top_balances_page(session, limit=15)
+    page = top_balances_page(session, limit=15, cursor=page.next_cursor)
+
+    python pagination.py --pages 200 --limit 50    # keyset vs OFFSET timing
+"""
+
+import argparse
+import base64
+import json
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from COMP353_project3 import top_active_balances
+
+CURSOR_VERSION = 1
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key: Tuple[float, str]) -> str:
+    raw = json.dumps([CURSOR_VERSION, *key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        version, balance, account_id = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(f"Malformed cursor: {cursor!r}") from exc
+    if version != CURSOR_VERSION or not isinstance(balance, (int, float)) or not isinstance(account_id, str):
+        raise InvalidCursor(f"Unsupported cursor: {cursor!r}")
+    return float(balance), account_id
+
+
+@dataclass
+class Page:
+    rows: List
+    next_cursor: Optional[str]   # None on the last page
+
+
+def top_balances_page(session, limit: int = 15, cursor: Optional[str] = None) -> Page:
+    """One page of Query 2, starting after `cursor` (None for the first page)."""
+    after = decode_cursor(cursor) if cursor else None
+    # Fetch one extra row to know whether another page exists.
+    rows = session.execute(top_active_balances(limit + 1, after=after)).all()
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, encode_cursor((last.AccountBalance, last.AccountID)))
+
+
+def iter_pages(session, limit: int = 15):
+    """Every page in order."""
+    cursor = None
+    while True:
+        page = top_balances_page(session, limit, cursor)
+        yield page
+        if page.next_cursor is None:
+            return
+        cursor = page.next_cursor
+
+
+def main():
+    from database import get_session
+
+    parser = argparse.ArgumentParser(description="Time keyset vs OFFSET pagination of Query 2")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=15)
+    args = parser.parse_args()
+
+    with get_session() as session:
+        keyset_ms, cursor = [], None
+        for _ in range(args.pages):
+            start = time.perf_counter()
+            cursor = top_balances_page(session, args.limit, cursor).next_cursor
+            keyset_ms.append((time.perf_counter() - start) * 1000)
+            if cursor is None:
+                break
+
+        offset_ms = []
+        for number in range(len(keyset_ms)):
+            start = time.perf_counter()
+            session.execute(top_active_balances(args.limit).offset(number * args.limit)).all()
+            offset_ms.append((time.perf_counter() - start) * 1000)
+
+    for label, times in (("keyset", keyset_ms), ("offset", offset_ms)):
+        if times:
+            print(f"{label:<7} first {times[0]:>8.2f} ms  last {times[-1]:>8.2f} ms  "
+                  f"mean {sum(times) / len(times):>8.2f} ms over {len(times)} pages")
+
+
+if __name__ == "__main__":
+    main()
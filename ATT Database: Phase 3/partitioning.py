@@ -0,0 +1,317 @@
+"""
+Optional monthly range partitioning of the invoice table (PostgreSQL only).
+
+The partitioned invoice table has the same columns and indexes as the
+Invoice model. Its primary key becomes (InvoiceID, InvoiceDate), because
+PostgreSQL requires the partition key in every unique constraint. The ORM
+keeps treating InvoiceID alone as the identity. There is one partition per
+calendar month, named invoice_yYYYYmMM, covering [first day, first day of
+next month), plus by default a DEFAULT partition, invoice_default, that
+takes any invoice dated outside them so that inserts never fail for lack
+of a partition. create_partition() moves the default partition's rows for
+a month into the new partition.
+
+The default partition and DETACH PARTITION ... CONCURRENTLY exclude each
+other: PostgreSQL refuses a concurrent detach while the table has a
+default partition. Create the table with default_partition=False
+(--no-default) if old months are to be detached without blocking; then
+every invoice needs its month's partition to exist first (billing.py
+creates the cycle's).
+
+Because of the composite key, ON CONFLICT targets on invoice must name
+both columns; upsert.py reads the key from the database for that reason.
+
+Reports bounded on InvoiceDate (invoice_payment_summary(start, end)) only
+scan the partitions in range. An old month can be detached and archived or
+dropped without touching the rest of the table.
+
+Usage:
+    python partitioning.py convert                    # existing invoice -> partitioned
+    python partitioning.py convert --no-default       # ... without invoice_default
+    python partitioning.py create --from 2024-01 --to 2025-12
+    python partitioning.py detach --month 2023-07 [--drop | --archive-schema archive]
+    python partitioning.py detach --month 2023-07 --concurrently   # no default partition only
+    python partitioning.py list
+    python partitioning.py explain --month 2024-11   # which partitions a month report reads
+"""
+
+import argparse
+import re
+from datetime import date
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from COMP353_project3 import Invoice
+
+PARTITION_KEY = "InvoiceDate"
+DEFAULT_PARTITION = "invoice_default"
+_PARTITION_NAME = re.compile(r"\b(invoice_y\d{4}m\d{2}|invoice_default)\b")
+
+
+# ============================
+#          MONTHS
+# ============================
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def months(start: date, end: date) -> Iterator[date]:
+    """First days of every month from start's month through end's month."""
+    month = month_start(start)
+    while month <= end:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(month: date) -> str:
+    return f"invoice_y{month.year:04d}m{month.month:02d}"
+
+
+def parse_month(value: str) -> date:
+    """'2024-11' or '2024-11-05' -> date(2024, 11, 1)."""
+    return month_start(date.fromisoformat(value if value.count("-") == 2 else value + "-01"))
+
+
+def _require_postgresql(bind) -> None:
+    if bind.dialect.name != "postgresql":
+        raise NotImplementedError("Invoice partitioning is PostgreSQL only")
+
+
+# ============================
+#           DDL
+# ============================
+def partitioned_table_ddl(dialect) -> str:
+    """CREATE TABLE for a partitioned invoice built from the Invoice model columns."""
+    table = Invoice.__table__
+    prep = dialect.identifier_preparer
+    columns = [
+        f"{prep.format_column(c)} {c.type.compile(dialect)}{'' if c.nullable else ' NOT NULL'}"
+        for c in table.columns
+    ]
+    for fk in table.foreign_key_constraints:
+        local = ", ".join(prep.format_column(c) for c in fk.columns)
+        remote = ", ".join(prep.format_column(e.column) for e in fk.elements)
+        columns.append(f"FOREIGN KEY ({local}) REFERENCES {prep.format_table(fk.referred_table)} ({remote})")
+    pk = [prep.quote(c.name) for c in table.primary_key.columns] + [prep.quote(PARTITION_KEY)]
+    columns.append(f"PRIMARY KEY ({', '.join(pk)})")
+    return (
+        f"CREATE TABLE {prep.format_table(table)} (\n    "
+        + ",\n    ".join(columns)
+        + f"\n) PARTITION BY RANGE ({prep.quote(PARTITION_KEY)})"
+    )
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def create_default_partition(conn) -> str:
+    _require_postgresql(conn)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF invoice DEFAULT"))
+    return DEFAULT_PARTITION
+
+
+def create_partition(conn, month: date) -> str:
+    """
+    Create the partition for `month` if it does not exist yet; returns its
+    name. Rows for that month already in the default partition are moved
+    into it (PostgreSQL refuses the new partition otherwise).
+    """
+    _require_postgresql(conn)
+    month = month_start(month)
+    name = partition_name(month)
+    if _exists(conn, name):
+        return name
+    bounds = {"start": month, "end": next_month(month)}
+    in_month = f'"{PARTITION_KEY}" >= :start AND "{PARTITION_KEY}" < :end'
+    moving = _exists(conn, DEFAULT_PARTITION) and conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month})"), bounds
+    ).scalar()
+    if moving:
+        conn.execute(text(
+            f"CREATE TEMP TABLE invoice_moving ON COMMIT DROP AS "
+            f"SELECT * FROM {DEFAULT_PARTITION} WHERE {in_month}"
+        ), bounds)
+        conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}"), bounds)
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF invoice "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    ))
+    if moving:
+        # Straight into the partition: the summary triggers on invoice must not count them again.
+        conn.execute(text(f"INSERT INTO {name} SELECT * FROM invoice_moving"))
+        conn.execute(text("DROP TABLE invoice_moving"))
+    return name
+
+
+def ensure_partitions(conn, start: date, end: date) -> List[str]:
+    """Partitions for every month from start through end (inclusive)."""
+    return [create_partition(conn, month) for month in months(start, end)]
+
+
+def create_partitioned_invoice(engine, start: date, end: date, default_partition: bool = True) -> None:
+    """Create a new, empty partitioned invoice table with its indexes and partitions."""
+    _require_postgresql(engine)
+    with engine.begin() as conn:
+        conn.execute(text(partitioned_table_ddl(engine.dialect)))
+        # Indexes on the parent are created on every partition, present and future.
+        for index in Invoice.__table__.indexes:
+            index.create(conn)
+        if default_partition:
+            create_default_partition(conn)
+        ensure_partitions(conn, start, end)
+
+
+def convert_invoice(engine, months_ahead: int = 3,
+                    default_partition: bool = True) -> Tuple[int, List[str]]:
+    """
+    Replace an existing plain invoice table with a partitioned one holding
+    the same rows, in one transaction. Partitions cover the oldest invoice
+    month through `months_ahead` months past the current one, plus
+    invoice_default unless `default_partition` is False. Returns (rows
+    copied, partitions created).
+    """
+    _require_postgresql(engine)
+    from invoice_summary import TRIGGERS_SQL, drop_triggers
+
+    with engine.begin() as conn:
+        if partitions(conn):
+            raise ValueError("invoice is already partitioned")
+        had_triggers = conn.execute(text(
+            "SELECT count(*) FROM pg_trigger "
+            "WHERE tgrelid = 'invoice'::regclass AND tgname LIKE 'invoice_summary_%'"
+        )).scalar()
+        drop_triggers(conn)
+
+        # Move the old table and its index/constraint names out of the way.
+        conn.execute(text("ALTER TABLE invoice RENAME TO invoice_unpartitioned"))
+        conn.execute(text("ALTER TABLE invoice_unpartitioned RENAME CONSTRAINT invoice_pkey TO invoice_unpartitioned_pkey"))
+        for index in Invoice.__table__.indexes:
+            conn.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name}_unpartitioned"))
+
+        oldest = conn.execute(text(f'SELECT min("{PARTITION_KEY}") FROM invoice_unpartitioned')).scalar()
+        last = date.today()
+        for _ in range(months_ahead):
+            last = next_month(last)
+
+        conn.execute(text(partitioned_table_ddl(engine.dialect)))
+        for index in Invoice.__table__.indexes:
+            index.create(conn)
+        if default_partition:
+            create_default_partition(conn)
+        created = ensure_partitions(conn, oldest or date.today(), last)
+
+        columns = ", ".join(engine.dialect.identifier_preparer.format_column(c) for c in Invoice.__table__.columns)
+        copied = conn.execute(text(
+            f"INSERT INTO invoice ({columns}) SELECT {columns} FROM invoice_unpartitioned"
+        )).rowcount
+        conn.execute(text("DROP TABLE invoice_unpartitioned"))
+
+        if had_triggers:
+            for sql in TRIGGERS_SQL:
+                conn.exec_driver_sql(sql)
+    return copied, created
+
+
+# ============================
+#        MAINTENANCE
+# ============================
+def partitions(conn) -> List[Tuple[str, str]]:
+    """(partition name, bound expression) for every attached invoice partition."""
+    return [
+        tuple(row) for row in conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'invoice'::regclass ORDER BY c.relname"
+        ))
+    ]
+
+
+def detach_partition(engine, month: date, drop: bool = False,
+                     archive_schema: Optional[str] = None, concurrently: bool = False) -> str:
+    """
+    Detach the partition for `month`. The detached table is then dropped,
+    moved to `archive_schema`, or left in place as a plain table.
+    CONCURRENTLY (PostgreSQL 14+) avoids blocking readers but cannot run
+    inside a transaction, so it uses an autocommit connection; PostgreSQL
+    also refuses it while invoice has a default partition, which is
+    checked first.
+    """
+    _require_postgresql(engine)
+    name = partition_name(month_start(month))
+    if concurrently:
+        with engine.connect() as conn:
+            if DEFAULT_PARTITION in dict(partitions(conn)):
+                raise ValueError(
+                    f"Cannot detach {name} concurrently: invoice has the default partition "
+                    f"{DEFAULT_PARTITION} (detach without --concurrently, or partition without a default)"
+                )
+    options = {"isolation_level": "AUTOCOMMIT"} if concurrently else {}
+    with engine.connect().execution_options(**options) as conn:
+        conn.execute(text(f"ALTER TABLE invoice DETACH PARTITION {name}{' CONCURRENTLY' if concurrently else ''}"))
+        if drop:
+            conn.execute(text(f"DROP TABLE {name}"))
+        elif archive_schema:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+            conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+        conn.commit()
+    return name
+
+
+def partitions_scanned(engine, stmt) -> List[str]:
+    """Invoice partitions that appear in the plan of `stmt`."""
+    from explain import explain
+
+    return sorted({m.group(1) for line in explain(engine, stmt) for m in _PARTITION_NAME.finditer(line)})
+
+
+def main():
+    from COMP353_project3 import invoice_payment_summary
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Manage monthly invoice partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="convert the existing invoice table")
+    convert.add_argument("--months-ahead", type=int, default=3)
+    convert.add_argument("--no-default", dest="default_partition", action="store_false",
+                         help="no invoice_default partition (allows detach --concurrently)")
+    create = sub.add_parser("create", help="create partitions for a range of months")
+    create.add_argument("--from", dest="start", required=True)
+    create.add_argument("--to", dest="end", required=True)
+    detach = sub.add_parser("detach", help="detach one month")
+    detach.add_argument("--month", required=True)
+    detach.add_argument("--drop", action="store_true")
+    detach.add_argument("--archive-schema")
+    detach.add_argument("--concurrently", action="store_true")
+    sub.add_parser("list", help="list attached partitions")
+    show = sub.add_parser("explain", help="partitions read by a one-month Query 5")
+    show.add_argument("--month", required=True)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    _require_postgresql(engine)
+    if args.command == "convert":
+        copied, created = convert_invoice(engine, args.months_ahead, args.default_partition)
+        print(f"copied {copied} invoices into {len(created)} partitions")
+    elif args.command == "create":
+        with engine.begin() as conn:
+            for name in ensure_partitions(conn, parse_month(args.start), parse_month(args.end)):
+                print(name)
+    elif args.command == "detach":
+        print(detach_partition(engine, parse_month(args.month), args.drop, args.archive_schema, args.concurrently))
+    elif args.command == "list":
+        with engine.connect() as conn:
+            for name, bound in partitions(conn):
+                print(f"{name:<20} {bound}")
+    else:
+        month = parse_month(args.month)
+        print(partitions_scanned(engine, invoice_payment_summary(month, next_month(month))))
+
+
+if __name__ == "__main__":
+    main()
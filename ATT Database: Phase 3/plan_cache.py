@@ -0,0 +1,287 @@
+"""
+In-process read-through cache of the plan dimension.
+
+plan is a dozen rows that almost never change, yet Query 3 joins it on
+every run. PlanCache keeps the rows in memory, keyed by PlanID, as plain
+PlanRow tuples (no ORM identity, safe to share between threads and
+sessions).
+
+Freshness comes from dimension_version: every write to plan bumps its
+counter there, and the cache compares the counter with the version it
+loaded at most once per `check_interval` seconds, a single primary key
+read. On a change the whole table is reloaded. A PlanID the cache does not
+know yet (a plan added since the last check) is a miss that reloads
+straight away. The counter is bumped in one of two ways, as with the
+invoice summary:
+
+  * enable_version_tracking()       - ORM flush hook, for Plan objects
+                                      written through a Session
+  * install_version_triggers(engine) - plan triggers (PostgreSQL statement
+                                      triggers, SQLite row triggers) for
+                                      every other write
+
+underfunded_active_contracts_cached() is Query 3 without the plan join:
+the fee comparison becomes a CASE over the cached fees and the plan
+columns are filled in from the cache. A PlanID the cache does not have
+falls through to a correlated subquery on plan, so a plan added since
+the last load is still compared with its real fee. Whether this beats
+the join depends on the backend; `python plan_cache.py` measures both.
+
+Usage:
+    cache = PlanCache()
+    cache.get(session, "P001").PlanMonthlyFee
+    rows = underfunded_active_contracts_cached(session, cache)
+
+    python plan_cache.py --repeat 50      # join vs cache, latency and plans
+"""
+
+import argparse
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import case, event, select
+from sqlalchemy.orm import Session
+
+from COMP353_project3 import Account, Contract, DimensionVersion, Plan
+from invoice_summary import dialect_insert
+
+DEFAULT_CHECK_INTERVAL = 5.0
+
+
+class PlanRow(NamedTuple):
+    PlanID: str
+    PlanName: str
+    PlanMonthlyFee: float
+    PlanDataLimitGB: Optional[int]
+    PlanShareable: bool
+
+
+# ============================
+#         VERSIONS
+# ============================
+def table_version(conn, table: str = "plan") -> int:
+    return conn.execute(
+        select(DimensionVersion.Version).where(DimensionVersion.TableName == table)
+    ).scalar() or 0
+
+
+def bump_version(conn, table: str = "plan") -> None:
+    stmt = dialect_insert(conn)(DimensionVersion).values(TableName=table, Version=1)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[DimensionVersion.TableName],
+        set_={"Version": DimensionVersion.Version + 1},
+    ))
+
+
+def _after_flush(session, flush_context) -> None:
+    if any(isinstance(obj, Plan) for obj in (*session.new, *session.dirty, *session.deleted)):
+        bump_version(session.connection())
+
+
+def enable_version_tracking(target=Session) -> None:
+    if not event.contains(target, "after_flush", _after_flush):
+        event.listen(target, "after_flush", _after_flush)
+
+
+def disable_version_tracking(target=Session) -> None:
+    if event.contains(target, "after_flush", _after_flush):
+        event.remove(target, "after_flush", _after_flush)
+
+
+PG_VERSION_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION dimension_version_bump() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO dimension_version ("TableName", "Version") VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT ("TableName") DO UPDATE SET "Version" = dimension_version."Version" + 1;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+PG_VERSION_TRIGGER_SQL = """
+CREATE TRIGGER plan_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON plan
+FOR EACH STATEMENT EXECUTE FUNCTION dimension_version_bump()
+"""
+
+# SQLite has no statement triggers; a bump per row changed is as good.
+SQLITE_VERSION_TRIGGER_SQL = """
+CREATE TRIGGER plan_version_{op} AFTER {op} ON plan
+BEGIN
+    INSERT OR IGNORE INTO dimension_version ("TableName", "Version") VALUES ('plan', 0);
+    UPDATE dimension_version SET "Version" = "Version" + 1 WHERE "TableName" = 'plan';
+END
+"""
+_SQLITE_OPS = ("insert", "update", "delete")
+
+
+def install_version_triggers(engine) -> None:
+    with engine.begin() as conn:
+        drop_version_triggers(conn)
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql(PG_VERSION_FUNCTION_SQL)
+            conn.exec_driver_sql(PG_VERSION_TRIGGER_SQL)
+        elif engine.dialect.name == "sqlite":
+            for op in _SQLITE_OPS:
+                conn.exec_driver_sql(SQLITE_VERSION_TRIGGER_SQL.format(op=op))
+        else:
+            raise NotImplementedError(f"No version triggers for {engine.dialect.name}")
+
+
+def drop_version_triggers(conn) -> None:
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("DROP TRIGGER IF EXISTS plan_version ON plan")
+    else:
+        for op in _SQLITE_OPS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS plan_version_{op}")
+
+
+# ============================
+#          CACHE
+# ============================
+class PlanCache:
+    def __init__(self, check_interval: float = DEFAULT_CHECK_INTERVAL, clock=time.monotonic):
+        self.check_interval = check_interval
+        self._clock = clock
+        self._plans: Dict[str, PlanRow] = {}
+        self._version: Optional[int] = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.version_checks = 0
+        self.reloads = 0
+
+    def reload(self, conn) -> None:
+        """Read the version, then every plan row; a write in between only means one more reload later."""
+        version = table_version(conn)
+        rows = conn.execute(select(*(Plan.__table__.c[f] for f in PlanRow._fields))).all()
+        with self._lock:
+            self._plans = {row.PlanID: PlanRow(*row) for row in rows}
+            self._version = version
+            self._checked = self._clock()
+            self.reloads += 1
+
+    def _refresh_if_stale(self, conn) -> None:
+        if self._version is not None and self._clock() - self._checked < self.check_interval:
+            return
+        version = table_version(conn) if self._version is not None else None
+        with self._lock:
+            self.version_checks += self._version is not None
+            self._checked = self._clock()
+        if version is None or version != self._version:
+            self.reload(conn)
+
+    def plans(self, conn) -> Dict[str, PlanRow]:
+        """Every plan by PlanID (the dict is replaced on reload, never changed in place)."""
+        self._refresh_if_stale(conn)
+        return self._plans
+
+    def get(self, conn, plan_id: str) -> PlanRow:
+        plan = self.plans(conn).get(plan_id)
+        if plan is None:
+            with self._lock:
+                self.misses += 1
+            self.reload(conn)
+            plan = self._plans.get(plan_id)
+            if plan is None:
+                raise KeyError(f"No plan {plan_id!r}")
+        else:
+            with self._lock:
+                self.hits += 1
+        return plan
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "plans": len(self._plans),
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "version_checks": self.version_checks,
+                "reloads": self.reloads,
+            }
+
+
+# ============================
+#      CACHED QUERY 3
+# ============================
+def underfunded_active_contracts_cached_stmt(plans: Dict[str, PlanRow]):
+    """Query 3 on contract and account, with the known plan fees inlined as a CASE."""
+    unknown_fee = select(Plan.PlanMonthlyFee).where(Plan.PlanID == Contract.PlanID).scalar_subquery()
+    # No WHEN clauses is not a valid CASE: an empty cache is all unknown plans.
+    fee = unknown_fee if not plans else case(
+        {p.PlanID: p.PlanMonthlyFee for p in plans.values()}, value=Contract.PlanID, else_=unknown_fee
+    )
+    return (
+        select(Contract.PlanID, Contract.ContractStatus, Account.AccountBalance)
+        .join(Account, Contract.AccountID == Account.AccountID)
+        .where(Contract.ContractStatus == "active", Account.AccountBalance < fee)
+        .order_by(Account.AccountBalance.desc())
+    )
+
+
+def underfunded_active_contracts_cached(conn, cache: PlanCache) -> List[tuple]:
+    """Query 3's rows (PlanName, PlanMonthlyFee, ContractStatus, AccountBalance) via the cache."""
+    plans = cache.plans(conn)
+    rows = conn.execute(underfunded_active_contracts_cached_stmt(plans)).all()
+    result = []
+    for plan_id, status, balance in rows:
+        # get() reloads on a PlanID added since `plans` was read.
+        plan = plans.get(plan_id) or cache.get(conn, plan_id)
+        result.append((plan.PlanName, plan.PlanMonthlyFee, status, balance))
+    return result
+
+
+# ============================
+#        MEASUREMENT
+# ============================
+def _mean_ms(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    from COMP353_project3 import create_schema, underfunded_active_contracts
+    from database import get_engine
+    from explain import explain
+
+    parser = argparse.ArgumentParser(description="Query 3 with the plan join vs the plan cache")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    create_schema(engine)
+    cache = PlanCache()
+    with engine.connect() as conn:
+        joined = conn.execute(underfunded_active_contracts()).all()
+        cached = underfunded_active_contracts_cached(conn, cache)
+        if sorted(map(tuple, joined)) != sorted(cached):
+            raise AssertionError("cached Query 3 differs from the join")
+
+        join_ms = _mean_ms(lambda: conn.execute(underfunded_active_contracts()).all(), args.repeat)
+        cache_ms = _mean_ms(lambda: underfunded_active_contracts_cached(conn, cache), args.repeat)
+        plans = cache.plans(conn)
+
+    print(f"Query 3, {len(joined)} rows, mean of {args.repeat} runs")
+    print(f"  {'join plan':<14} {join_ms:>9.2f} ms")
+    print(f"  {'plan cache':<14} {cache_ms:>9.2f} ms")
+    for label, stmt in (
+        ("join plan", underfunded_active_contracts()),
+        ("plan cache", underfunded_active_contracts_cached_stmt(plans)),
+    ):
+        print(f"\n{label}:")
+        for line in explain(engine, stmt):
+            print(f"  {line}")
+    print(f"\ncache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
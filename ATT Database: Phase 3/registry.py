@@ -0,0 +1,162 @@
+"""
+Registry of named, parameterized report statements, built once.
+
+Calling a report builder constructs a new select() chain every time, and
+SQLAlchemy then has to walk it to compute a cache key before it can reuse
+the compiled SQL. The statements here are built once at import, with
+bindparam() placeholders for the inputs, so a call only binds values:
+
+    REGISTRY.execute(session, "q2_top_active_balances_limit", limit=50)
+
+For the hottest callers, execute_driver() goes one step further. The SQL
+string is compiled once per dialect and sent with exec_driver_sql(), which
+skips statement compilation and cache-key generation entirely. Values come
+back as the driver returns them, e.g. dates are strings on SQLite.
+
+Server-side prepared statements depend on the driver. asyncpg prepares and
+caches every statement by itself, and psycopg 3 does once prepare_threshold
+is set (see database.SERVER_PREPARE_CONNECT_ARGS). psycopg2 and sqlite3
+have no such protocol support, so there the compiled-once string is what
+saves time.
+
+Usage:
+    python registry.py --report q2_top_active_balances --calls 2000
+"""
+
+import argparse
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Date, Float, Integer, String, bindparam, lambda_stmt
+
+from COMP353_project3 import (
+    REPORTS,
+    contracts_ending_between,
+    invoice_payment_summary,
+    top_active_balances,
+)
+
+
+@dataclass
+class _Compiled:
+    sql: str
+    names: List[str]        # parameter names in driver order
+    positional: bool
+    defaults: Dict[str, object] = field(default_factory=dict)
+
+
+class StatementRegistry:
+    def __init__(self):
+        self._statements: Dict[str, object] = {}
+        self._compiled: Dict[Tuple[str, str], _Compiled] = {}
+
+    def register(self, name: str, stmt) -> None:
+        if name in self._statements:
+            raise ValueError(f"Statement {name!r} is already registered")
+        self._statements[name] = stmt
+
+    def names(self) -> List[str]:
+        return sorted(self._statements)
+
+    def statement(self, name: str):
+        try:
+            return self._statements[name]
+        except KeyError:
+            raise KeyError(f"No statement registered as {name!r}") from None
+
+    def execute(self, session, name: str, **params):
+        """Execute on a Session or Connection; unset parameters use their defaults."""
+        return session.execute(self.statement(name), params)
+
+    # ---------- compiled once, executed as driver SQL ----------
+    def compiled(self, name: str, dialect) -> _Compiled:
+        key = (name, dialect.name)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            c = self.statement(name).compile(dialect=dialect)
+            names = list(c.positiontup) if c.positional else list(c.params)
+            compiled = _Compiled(c.string, names, c.positional, dict(c.params))
+            self._compiled[key] = compiled
+        return compiled
+
+    def execute_driver(self, conn, name: str, **params):
+        """Run the precompiled SQL string on a Connection; rows are raw driver values."""
+        c = self.compiled(name, conn.dialect)
+        values = {**c.defaults, **params}
+        if c.positional:
+            return conn.exec_driver_sql(c.sql, tuple(values[n] for n in c.names))
+        return conn.exec_driver_sql(c.sql, {n: values[n] for n in c.names})
+
+
+REGISTRY = StatementRegistry()
+
+# Parameterless reports, q6 excepted: its window depends on today's date.
+for _name, _builder in REPORTS.items():
+    if _name != "q6_contracts_expiring_30d":
+        REGISTRY.register(_name, _builder())
+
+# Q2 with the row limit as a parameter instead of baked in.
+REGISTRY.register(
+    "q2_top_active_balances_limit",
+    top_active_balances(bindparam("limit", 15, type_=Integer)),
+)
+REGISTRY.register(
+    "q2_top_active_balances_page",
+    top_active_balances(
+        bindparam("limit", 15, type_=Integer),
+        after=(bindparam("after_balance", type_=Float), bindparam("after_account", type_=String)),
+    ),
+)
+REGISTRY.register(
+    "q5_invoice_payment_summary_period",
+    invoice_payment_summary(bindparam("start", type_=Date), bindparam("end", type_=Date)),
+)
+REGISTRY.register(
+    "q6_contracts_ending_between",
+    contracts_ending_between(bindparam("start", type_=Date), bindparam("end", type_=Date)),
+)
+
+
+# ============================
+#      MICRO-BENCHMARK
+# ============================
+def _timed(fn, calls: int) -> float:
+    """Mean microseconds per call."""
+    fn()  # warm the compiled cache
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Per-call overhead of building vs registered statements")
+    parser.add_argument("--report", choices=sorted(set(REPORTS) & set(REGISTRY.names())),
+                        default="q2_top_active_balances")
+    parser.add_argument("--calls", type=int, default=1000)
+    args = parser.parse_args()
+
+    builder = REPORTS[args.report]
+    engine = get_engine()
+    dialect = engine.dialect
+
+    print(f"{args.report}, {args.calls} calls, mean per call")
+    print(f"  {'build + compile only':<24} {_timed(lambda: builder().compile(dialect=dialect), args.calls):>10.1f} us")
+    print(f"  {'build + cache key only':<24} {_timed(lambda: builder()._generate_cache_key(), args.calls):>10.1f} us")
+
+    with engine.connect() as conn:
+        cases = {
+            "build each call": lambda: conn.execute(builder()).all(),
+            "lambda_stmt": lambda: conn.execute(lambda_stmt(lambda: builder())).all(),
+            "registry": lambda: REGISTRY.execute(conn, args.report).all(),
+            "registry driver SQL": lambda: REGISTRY.execute_driver(conn, args.report).all(),
+        }
+        for label, fn in cases.items():
+            print(f"  {label:<24} {_timed(fn, args.calls):>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
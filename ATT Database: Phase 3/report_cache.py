@@ -0,0 +1,238 @@
+"""
+In-process result cache for the report statements.
+
+Entries are keyed by the compiled SQL plus its bound parameters and are
+evicted LRU-first once `maxsize` is reached, or when older than `ttl`
+seconds. Each entry remembers which tables its statement reads. Once
+attached, session events invalidate only the entries that read a table
+the session wrote:
+
+  * after_flush    - ORM inserts/updates/deletes (Account, Contract, Invoice, ...)
+  * do_orm_execute - bulk/Core DML run through the session
+  * after_commit   - once more, so nothing cached between flush and commit
+                     survives
+
+Session events do not see writes made on a plain Engine/Connection, which
+is how billing.py, sweeper.py, sync.py and bulk_load.py write. For those,
+attach_engine() listens on the engine instead (after_execute for Core
+insert/update/delete, then commit). Raw SQL strings (exec_driver_sql) are
+not parsed and invalidate nothing; entries they make stale live until
+`ttl`.
+
+Every table also has a generation number, bumped by each invalidation.
+execute() notes the generations of the tables it reads before running the
+statement and does not store the rows if any moved in the meantime, so an
+invalidation that lands while a query is running is not lost.
+
+Usage:
+    cache = ReportCache(maxsize=128, ttl=30)
+    cache.attach()
+    cache.attach_engine(engine)
+    rows = cache.execute(session, top_active_balances())
+    print(cache.stats())
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.util import find_tables
+
+# Tables whose contents are derived from another table by a write-side hook
+# (see invoice_summary.py), so a write to the source also invalidates them.
+DERIVED_TABLES = {
+    "invoice": {"invoice_account_summary"},
+}
+
+_PENDING_KEY = "report_cache_tables"
+
+
+@dataclass
+class _Entry:
+    rows: Tuple
+    tables: FrozenSet[str]
+    expires: float
+
+
+def statement_tables(stmt) -> FrozenSet[str]:
+    return frozenset(
+        t.name for t in find_tables(stmt, include_joins=True, include_aliases=True, include_crud=True)
+    )
+
+
+class ReportCache:
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._targets = []
+        self._engines = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+
+    # ---------- reads ----------
+    @staticmethod
+    def key(stmt, dialect) -> tuple:
+        compiled = stmt.compile(dialect=dialect)
+        params = tuple(sorted((k, repr(v)) for k, v in compiled.params.items()))
+        return compiled.string, params
+
+    def execute(self, session, stmt) -> Tuple:
+        """Return the rows of `stmt` as a tuple, from cache when possible.
+
+        Cached rows are shared between callers, hence a tuple: a caller that
+        needs to sort or append works on its own list(rows).
+        """
+        key = self.key(stmt, session.get_bind().dialect)
+        tables = statement_tables(stmt)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.rows
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            generations = self._table_generations(tables)
+
+        rows = tuple(session.execute(stmt).all())
+
+        with self._lock:
+            if self._table_generations(tables) != generations:
+                self.stale_stores += 1
+                return rows
+            self._entries[key] = _Entry(rows, tables, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return rows
+
+    # ---------- invalidation ----------
+    def _table_generations(self, tables: FrozenSet[str]) -> tuple:
+        return tuple(self._generations.get(t, 0) for t in sorted(tables))
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        tables = set(tables)
+        for name in list(tables):
+            tables |= DERIVED_TABLES.get(name, set())
+        with self._lock:
+            for name in tables:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            stale = [k for k, e in self._entries.items() if e.tables & tables]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_stores": self.stale_stores,
+            }
+
+    # ---------- session events ----------
+    def _after_flush(self, session, flush_context) -> None:
+        tables = set()
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            mapper = getattr(obj, "__mapper__", None)
+            if mapper is not None:
+                tables.update(t.name for t in mapper.tables)
+        if tables:
+            session.info.setdefault(_PENDING_KEY, set()).update(tables)
+            self.invalidate_tables(tables)
+
+    def _do_orm_execute(self, orm_execute_state) -> None:
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            tables = statement_tables(orm_execute_state.statement)
+            orm_execute_state.session.info.setdefault(_PENDING_KEY, set()).update(tables)
+            self.invalidate_tables(tables)
+
+    def _after_commit(self, session) -> None:
+        tables = session.info.pop(_PENDING_KEY, None)
+        if tables:
+            self.invalidate_tables(tables)
+
+    def _after_rollback(self, session) -> None:
+        session.info.pop(_PENDING_KEY, None)
+
+    _EVENTS = (
+        ("after_flush", "_after_flush"),
+        ("do_orm_execute", "_do_orm_execute"),
+        ("after_commit", "_after_commit"),
+        ("after_soft_rollback", "_after_rollback"),
+    )
+
+    def attach(self, target=Session) -> None:
+        """Listen for writes on `target` (a Session class, sessionmaker or instance)."""
+        for name, method in self._EVENTS:
+            event.listen(target, name, getattr(self, method))
+        self._targets.append(target)
+
+    def detach(self, target: Optional[object] = None) -> None:
+        for t in [target] if target is not None else list(self._targets):
+            for name, method in self._EVENTS:
+                if event.contains(t, name, getattr(self, method)):
+                    event.remove(t, name, getattr(self, method))
+            self._targets.remove(t)
+
+    # ---------- engine events ----------
+    def _after_execute(self, conn, clauseelement, multiparams, params, execution_options, result) -> None:
+        if isinstance(clauseelement, UpdateBase):
+            tables = statement_tables(clauseelement)
+            conn.info.setdefault(_PENDING_KEY, set()).update(tables)
+            self.invalidate_tables(tables)
+
+    def _engine_commit(self, conn) -> None:
+        tables = conn.info.pop(_PENDING_KEY, None)
+        if tables:
+            self.invalidate_tables(tables)
+
+    def _engine_rollback(self, conn) -> None:
+        conn.info.pop(_PENDING_KEY, None)
+
+    _ENGINE_EVENTS = (
+        ("after_execute", "_after_execute"),
+        ("commit", "_engine_commit"),
+        ("rollback", "_engine_rollback"),
+    )
+
+    def attach_engine(self, engine) -> None:
+        """Listen for Core DML on `engine` (or the Engine class), including writes outside any Session."""
+        for name, method in self._ENGINE_EVENTS:
+            event.listen(engine, name, getattr(self, method))
+        self._engines.append(engine)
+
+    def detach_engine(self, engine: Optional[object] = None) -> None:
+        for e in [engine] if engine is not None else list(self._engines):
+            for name, method in self._ENGINE_EVENTS:
+                if event.contains(e, name, getattr(self, method)):
+                    event.remove(e, name, getattr(self, method))
+            self._engines.remove(e)
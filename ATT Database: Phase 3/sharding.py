@@ -0,0 +1,335 @@
+"""
+CustomerID hash sharding across several ATT databases.
+
+Each customer lives on shard crc32(CustomerID) % N together with
+everything it owns: its accounts and their contracts, devices, invoices
+and invoice summary rows. plan is small and referenced by every contract,
+so it is replicated to every shard. Every shard has the full schema, so
+all the foreign keys still hold inside a shard.
+
+Every report groups and joins within one customer's rows, so it runs
+unchanged on each shard, and only the results need merging:
+
+  * unordered reports (Query 1)     - concatenated
+  * ordered reports (Queries 2 - 6) - k-way merged on the ORDER BY columns
+                                      with heapq.merge, each shard already
+                                      returning its rows in that order
+  * limited reports (Query 2)       - every shard returns its own top N
+                                      (after the same keyset cursor, if
+                                      any), and the global top N is the
+                                      first N rows of the merge
+
+Shards are queried in parallel from a thread pool, one worker per shard.
+
+Uniqueness that is not keyed by customer (CustomerEmail, DeviceIMEI) is
+only enforced per shard.
+
+Usage:
+    python sharding.py --shards sqlite:////tmp/s0.db,sqlite:////tmp/s1.db --load 20000
+    python sharding.py --shards sqlite:////tmp/s0.db,sqlite:////tmp/s1.db --compare sqlite:////tmp/att.db
+"""
+
+import argparse
+import heapq
+import inspect
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from COMP353_project3 import (
+    REPORTS,
+    active_contract_customers,
+    active_customers,
+    active_devices_summary,
+    contracts_expiring_within,
+    create_schema,
+    invoice_payment_summary,
+    invoice_payment_summary_materialized,
+    top_active_balances,
+    underfunded_active_contracts,
+)
+
+# Tables whose rows belong to one customer, and the column that leads there.
+SHARDED_TABLES = {
+    "customer": "CustomerID",
+    "account": "CustomerID",
+    "contract": "AccountID",
+    "device": "AccountID",
+    "invoice": "AccountID",
+    "invoice_account_summary": "AccountID",
+}
+REPLICATED_TABLES = ("plan",)
+
+
+def shard_of(customer_id: str, shards: int) -> int:
+    # crc32, not hash(): it has to be the same in every process.
+    return zlib.crc32(customer_id.encode()) % shards
+
+
+# ============================
+#          REPORTS
+# ============================
+@dataclass(frozen=True)
+class ShardedReport:
+    """
+    How to merge a report: the ORDER BY columns, their direction, and the
+    builder argument holding its LIMIT, if it has one.
+    """
+    build: Callable
+    order_by: Tuple[str, ...] = ()
+    descending: bool = False
+    limit_arg: Optional[str] = None
+
+    def limit(self, *args, **kwargs) -> Optional[int]:
+        """The LIMIT the builder applies when called with these arguments."""
+        if self.limit_arg is None:
+            return None
+        bound = inspect.signature(self.build).bind(*args, **kwargs)
+        bound.apply_defaults()
+        return bound.arguments[self.limit_arg]
+
+
+SHARDED_REPORTS = {
+    "q1_active_contract_customers": ShardedReport(active_contract_customers),
+    "q1_active_customers_semijoin": ShardedReport(active_customers),
+    "q2_top_active_balances": ShardedReport(
+        top_active_balances, ("AccountBalance", "AccountID"), descending=True, limit_arg="limit"
+    ),
+    "q3_underfunded_active_contracts": ShardedReport(
+        underfunded_active_contracts, ("AccountBalance",), descending=True
+    ),
+    "q4_active_devices_summary": ShardedReport(
+        active_devices_summary, ("NumDevices", "NumActiveContracts"), descending=True
+    ),
+    "q5_invoice_payment_summary": ShardedReport(
+        invoice_payment_summary, ("TotalUnpaidAmount",), descending=True
+    ),
+    "q5_invoice_payment_summary_materialized": ShardedReport(
+        invoice_payment_summary_materialized, ("TotalUnpaidAmount",), descending=True
+    ),
+    "q6_contracts_expiring_30d": ShardedReport(
+        contracts_expiring_within, ("ContractEndDate", "AccountID")
+    ),
+}
+
+
+def check_reports() -> None:
+    """Fail if a report was added to (or dropped from) REPORTS without a merge rule here."""
+    missing, extra = set(REPORTS) - set(SHARDED_REPORTS), set(SHARDED_REPORTS) - set(REPORTS)
+    if missing or extra:
+        raise ValueError(f"SHARDED_REPORTS out of date: missing {sorted(missing)}, unknown {sorted(extra)}")
+
+
+def merge_results(report: ShardedReport, results: Sequence[List], limit: Optional[int] = None) -> List:
+    """Combine per-shard rows into what the report returns on one database; keep the first `limit`."""
+    if not report.order_by:
+        merged = chain.from_iterable(results)
+    else:
+        def key(row):
+            return tuple(row._mapping[c] for c in report.order_by)
+
+        merged = heapq.merge(*results, key=key, reverse=report.descending)
+    return list(islice(merged, limit))
+
+
+# ============================
+#          SHARD SET
+# ============================
+class ShardSet:
+    def __init__(self, engines: Sequence):
+        if not engines:
+            raise ValueError("At least one shard is required")
+        self.engines = list(engines)
+        self._pool = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="shard")
+
+    @classmethod
+    def from_urls(cls, urls: Iterable[str], config=None, **overrides) -> "ShardSet":
+        from database import EngineConfig, make_engine
+
+        config = config or EngineConfig.from_env()
+        return cls([make_engine(replace(config, url=url), **overrides) for url in urls])
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_of(self, customer_id: str) -> int:
+        return shard_of(customer_id, len(self.engines))
+
+    def engine_for(self, customer_id: str):
+        """The engine holding `customer_id`; use it for that customer's writes and lookups."""
+        return self.engines[self.shard_of(customer_id)]
+
+    def create_schema(self) -> None:
+        self.fan_out(create_schema)
+
+    def dispose(self) -> None:
+        self._pool.shutdown()
+        for engine in self.engines:
+            engine.dispose()
+
+    # ---------- routing rows ----------
+    def split(self, data: Dict[str, Iterable[dict]],
+              account_shards: Optional[Dict[str, int]] = None) -> List[Dict[str, List[dict]]]:
+        """
+        Split {table: rows} into one such dict per shard; replicated tables
+        go to all of them. Account rows must come with (or before, through
+        `account_shards`) the rows that reference them.
+        """
+        from bulk_load import _table_name
+
+        account_shards = {} if account_shards is None else account_shards
+        by_table = {_table_name(key): rows for key, rows in data.items()}
+        parts = [{} for _ in self.engines]
+        for name in ("customer", "account", *(t for t in by_table if t not in ("customer", "account"))):
+            if name not in by_table:
+                continue
+            rows = list(by_table[name])
+            if name in REPLICATED_TABLES:
+                for part in parts:
+                    part[name] = rows
+                continue
+            if name not in SHARDED_TABLES:
+                raise ValueError(f"Table {name} is neither sharded nor replicated")
+            for part in parts:
+                part[name] = []
+            for row in rows:
+                if SHARDED_TABLES[name] == "CustomerID":
+                    shard = self.shard_of(row["CustomerID"])
+                    if name == "account":
+                        account_shards[row["AccountID"]] = shard
+                else:
+                    shard = account_shards[row["AccountID"]]
+                parts[shard][name].append(row)
+        return parts
+
+    def load(self, chunks: Iterable[Dict[str, List[dict]]], log=print) -> None:
+        """
+        bulk_load datagen-style chunks, each shard's part loaded in
+        parallel, then rebuild every shard's invoice summary.
+        """
+        from bulk_load import LoadReport, bulk_load
+        from invoice_summary import refresh_invoice_summary
+
+        reports = [LoadReport() for _ in self.engines]
+        account_shards: Dict[str, int] = {}
+        for chunk in chunks:
+            parts = self.split(chunk, account_shards)
+            list(self._pool.map(
+                lambda i: bulk_load(self.engines[i], parts[i], report=reports[i], log=None),
+                range(len(self.engines)),
+            ))
+
+        def refresh(engine):
+            with engine.begin() as conn:
+                refresh_invoice_summary(conn)
+
+        self.fan_out(refresh)
+        if log is not None:
+            for i, report in enumerate(reports):
+                log(f"shard {i}: {report.rows} rows in {report.seconds:.2f} s")
+
+    # ---------- fan-out ----------
+    def fan_out(self, fn: Callable) -> List:
+        """fn(engine) on every shard in parallel; results in shard order."""
+        return list(self._pool.map(fn, self.engines))
+
+    def execute(self, stmt) -> List[List]:
+        def run(engine):
+            with engine.connect() as conn:
+                return conn.execute(stmt).all()
+
+        return self.fan_out(run)
+
+    def run_report(self, name: str, *args, **kwargs) -> List:
+        """Report `name` across all shards; arguments (limit, after, ...) go to its builder."""
+        report = SHARDED_REPORTS[name]
+        results = self.execute(report.build(*args, **kwargs))
+        return merge_results(report, results, report.limit(*args, **kwargs))
+
+
+# ============================
+#          CHECKING
+# ============================
+def _canonical(rows) -> List[tuple]:
+    return sorted((tuple(row) for row in rows), key=repr)
+
+
+def compare(shards: ShardSet, engine, names: Iterable[str] = SHARDED_REPORTS) -> Dict[str, Tuple[float, float]]:
+    """
+    Run each report sharded and on `engine` (one database with the same
+    data), fail on any difference, and return (sharded, single) seconds.
+    Ordered reports must agree on the order of their ORDER BY values; rows
+    tied on those may come in any order, as on one database.
+    """
+    check_reports()
+    timings = {}
+    for name in names:
+        report = SHARDED_REPORTS[name]
+        start = time.perf_counter()
+        sharded = shards.run_report(name)
+        sharded_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            single = conn.execute(report.build()).all()
+        single_seconds = time.perf_counter() - start
+
+        limited = report.limit_arg is not None
+        if not limited and _canonical(sharded) != _canonical(single):
+            raise AssertionError(f"{name}: sharded rows differ from the single database")
+        if report.order_by:
+            def keys(rows):
+                return [tuple(r._mapping[c] for c in report.order_by) for r in rows]
+            if keys(sharded) != keys(single):
+                raise AssertionError(f"{name}: sharded order differs from the single database")
+        if limited and len(sharded) != len(single):
+            raise AssertionError(f"{name}: {len(sharded)} rows sharded, {len(single)} on one database")
+        timings[name] = (sharded_seconds, single_seconds)
+    return timings
+
+
+def compare_top_balance_pages(shards: ShardSet, engine, limit: int = 50, pages: int = 3) -> None:
+    """Walk Query 2 in keyset pages of `limit`, sharded and on `engine`; fail on any difference."""
+    after = None
+    for page in range(pages):
+        sharded = shards.run_report("q2_top_active_balances", limit, after=after)
+        with engine.connect() as conn:
+            single = conn.execute(top_active_balances(limit, after=after)).all()
+        if [tuple(r) for r in sharded] != [tuple(r) for r in single]:
+            raise AssertionError(f"q2_top_active_balances page {page} (limit {limit}) differs")
+        if len(sharded) < limit:
+            return
+        after = (sharded[-1].AccountBalance, sharded[-1].AccountID)
+
+
+def main():
+    import datagen
+    from database import EngineConfig, make_engine
+
+    parser = argparse.ArgumentParser(description="Load and query a CustomerID-sharded ATT deployment")
+    parser.add_argument("--shards", required=True, help="comma-separated shard URLs")
+    parser.add_argument("--load", type=int, metavar="CUSTOMERS", help="generate and load this many customers")
+    parser.add_argument("--compare", metavar="URL", help="check every report against a single database")
+    parser.add_argument("--seed", type=int, default=datagen.DEFAULT_SEED)
+    args = parser.parse_args()
+
+    shards = ShardSet.from_urls(u.strip() for u in args.shards.split(","))
+    try:
+        shards.create_schema()
+        if args.load:
+            shards.load(datagen.generate(args.load, seed=args.seed))
+        if args.compare:
+            engine = make_engine(replace(EngineConfig.from_env(), url=args.compare))
+            print(f"{'Report':<42} {'Sharded':>9} {'Single':>9}")
+            for name, (sharded, single) in compare(shards, engine).items():
+                print(f"{name:<42} {sharded:>8.3f}s {single:>8.3f}s")
+            compare_top_balance_pages(shards, engine)
+            print(f"all reports match across {len(shards)} shards")
+    finally:
+        shards.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Per-customer billing statements with batched eager loading.
+
+The relationships on the models are lazy "select" loads, so walking
+customer -> accounts -> contracts/devices/invoices object by object costs
+one query per collection (N+1). load_customers() instead loads a batch of
+customers and their whole graph with selectinload, which is one
+SELECT ... WHERE key IN (...) per relationship level:
+
+    customers, accounts, contracts, plans, devices, invoices
+
+That is STATEMENT_QUERIES round trips per batch, whatever the number of
+customers in it, as long as every IN list fits in one query. selectinload
+splits IN lists longer than SELECTIN_CHUNK keys into several queries, and
+the contract, device and invoice levels are keyed by AccountID, so the
+default batch holds few enough customers that their accounts usually
+stay within one chunk. expected_queries() counts the chunks a loaded
+batch really needed, and check_round_trips() holds each batch to that.
+Every other relationship is raiseload, so a stray lazy load fails loudly
+instead of adding queries.
+
+Usage:
+    for statement in iter_statements(session, customer_ids):
+        print(statement.CustomerID, statement.balance_due)
+
+    python statements.py --customers 2000     # also checks the query count
+    python statements.py --self-check         # the same on generated data in memory
+"""
+
+import argparse
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import raiseload, selectinload
+
+from COMP353_project3 import Account, Contract, Customer
+
+# One IN query per level: customers, accounts, contracts, plans, devices, invoices.
+STATEMENT_QUERIES = 6
+# SQLAlchemy's selectinload splits IN lists above this many keys.
+SELECTIN_CHUNK = 500
+# Generated customers hold one to three accounts, so 150 of them stay under one chunk of accounts.
+STATEMENT_BATCH_SIZE = 150
+
+
+def statement_options():
+    accounts = selectinload(Customer.accounts)
+    contracts = accounts.selectinload(Account.contracts)
+    return (
+        contracts.selectinload(Contract.plan).raiseload("*"),
+        contracts.raiseload("*"),
+        accounts.selectinload(Account.devices).raiseload("*"),
+        accounts.selectinload(Account.invoices).raiseload("*"),
+        accounts.raiseload("*"),
+        raiseload("*"),
+    )
+
+
+def load_customers(session, customer_ids: Iterable[str]) -> List[Customer]:
+    """Customers with accounts, contracts, plans, devices and invoices loaded."""
+    customer_ids = list(customer_ids)
+    if len(customer_ids) > SELECTIN_CHUNK:
+        raise ValueError(f"At most {SELECTIN_CHUNK} customers per batch")
+    stmt = (
+        select(Customer)
+        .where(Customer.CustomerID.in_(customer_ids))
+        .options(*statement_options())
+        .order_by(Customer.CustomerID)
+    )
+    return list(session.scalars(stmt))
+
+
+# ============================
+#         STATEMENT
+# ============================
+@dataclass
+class AccountLine:
+    AccountID: str
+    AccountType: str
+    AccountBalance: float
+    plans: List[str]
+    devices: List[str]
+    invoiced: float
+    unpaid: float
+    overdue: int
+
+
+@dataclass
+class CustomerStatement:
+    CustomerID: str
+    name: str
+    email: str
+    accounts: List[AccountLine] = field(default_factory=list)
+
+    @property
+    def balance_due(self) -> float:
+        return sum(a.unpaid for a in self.accounts)
+
+
+def build_statement(customer: Customer) -> CustomerStatement:
+    statement = CustomerStatement(
+        customer.CustomerID,
+        f"{customer.CustomerFirstName} {customer.CustomerLastName}",
+        customer.CustomerEmail,
+    )
+    for account in customer.accounts:
+        statement.accounts.append(AccountLine(
+            account.AccountID,
+            account.AccountType,
+            account.AccountBalance,
+            [c.plan.PlanName for c in account.contracts if c.ContractStatus == "active"],
+            [d.DeviceModel for d in account.devices],
+            sum(i.InvoiceAmount for i in account.invoices),
+            sum(i.InvoiceAmount for i in account.invoices if i.InvoiceStatus == "unpaid"),
+            sum(1 for i in account.invoices if i.InvoiceStatus == "overdue"),
+        ))
+    return statement
+
+
+def iter_batches(session, customer_ids: Iterable[str],
+                 batch_size: int = STATEMENT_BATCH_SIZE) -> Iterator[List[Customer]]:
+    """Loaded customers, batch by batch; the session is cleared after each batch is used."""
+    customer_ids = list(customer_ids)
+    for i in range(0, len(customer_ids), batch_size):
+        yield load_customers(session, customer_ids[i:i + batch_size])
+        session.expunge_all()
+
+
+def iter_statements(session, customer_ids: Iterable[str],
+                    batch_size: int = STATEMENT_BATCH_SIZE) -> Iterator[CustomerStatement]:
+    """Statements for `customer_ids`, loaded batch by batch."""
+    for customers in iter_batches(session, customer_ids, batch_size):
+        for customer in customers:
+            yield build_statement(customer)
+
+
+# ============================
+#        QUERY COUNT
+# ============================
+@contextmanager
+def count_queries(engine):
+    """
+    Yields a list that collects every statement executed on `engine` (or
+    the Engine class) by the calling thread while the block runs.
+    """
+    statements = []
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _chunks(keys: int) -> int:
+    return -(-keys // SELECTIN_CHUNK)
+
+
+def expected_queries(customers: List[Customer]) -> int:
+    """
+    Most queries loading this batch can take: one per IN chunk of each
+    level. STATEMENT_QUERIES when every level fits in one chunk.
+    """
+    accounts = [a for c in customers for a in c.accounts]
+    plans = {k.PlanID for a in accounts for k in a.contracts}
+    # customers; accounts by CustomerID; contracts, devices, invoices by AccountID; plans.
+    return 1 + _chunks(len(customers)) + 3 * _chunks(len(accounts)) + _chunks(len(plans))
+
+
+def check_round_trips(session, customer_ids: List[str], batch_size: int = STATEMENT_BATCH_SIZE) -> int:
+    """Build the statements and fail if any batch ran more queries than its chunks account for."""
+    total = 0
+    # Every engine, since a routing session may read from a replica.
+    with count_queries(Engine) as queries:
+        for customers in iter_batches(session, customer_ids, batch_size):
+            for customer in customers:
+                build_statement(customer)
+            expected = expected_queries(customers)
+            if len(queries) > expected:
+                raise AssertionError(
+                    f"{len(queries)} queries for a batch of {len(customers)} customers, expected at most "
+                    f"{expected}:\n" + "\n".join(queries)
+                )
+            total += len(queries)
+            queries.clear()
+    return total
+
+
+def self_check(customers: int = 600) -> None:
+    """
+    check_round_trips() on generated data in an in-memory SQLite database,
+    with the default batch and with batches big enough to split the IN lists.
+    """
+    import datagen
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from COMP353_project3 import create_schema
+
+    engine = create_engine("sqlite://")
+    create_schema(engine)
+    datagen.load(engine, customers)
+    with Session(engine) as session:
+        ids = session.scalars(select(Customer.CustomerID).order_by(Customer.CustomerID)).all()
+        for batch_size in (STATEMENT_BATCH_SIZE, SELECTIN_CHUNK):
+            batches = -(-len(ids) // batch_size)
+            queries = check_round_trips(session, ids, batch_size)
+            print(f"batch {batch_size}: {queries} queries for {batches} batches "
+                  f"({batches * STATEMENT_QUERIES} if no IN list split)")
+    engine.dispose()
+
+
+def main():
+    import time
+
+    from database import get_session
+
+    parser = argparse.ArgumentParser(description="Build customer statements and count round trips")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=STATEMENT_BATCH_SIZE)
+    parser.add_argument("--self-check", action="store_true",
+                        help="check the query count on generated data in memory, then exit")
+    args = parser.parse_args()
+
+    if args.self_check:
+        self_check()
+        return
+
+    with get_session() as session:
+        ids = session.scalars(select(Customer.CustomerID).order_by(Customer.CustomerID).limit(args.customers)).all()
+        start = time.perf_counter()
+        queries = check_round_trips(session, ids, args.batch_size)
+        seconds = time.perf_counter() - start
+
+        # The same statements with the default lazy loads, for comparison.
+        with count_queries(Engine) as lazy:
+            for customer in session.scalars(select(Customer).where(Customer.CustomerID.in_(ids[:args.batch_size]))):
+                build_statement(customer)
+        session.expunge_all()
+
+    print(f"{len(ids)} statements: {queries} queries in {seconds:.2f} s ({STATEMENT_QUERIES} per unsplit batch)")
+    print(f"lazy loading, first batch only: {len(lazy)} queries")
+
+
+if __name__ == "__main__":
+    main()
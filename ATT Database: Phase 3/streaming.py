@@ -0,0 +1,98 @@
+"""
+Streaming execution for the report queries.
+
+Instead of session.execute(stmt).all(), rows are fetched yield_per at a time.
+On PostgreSQL this uses a server-side (named) cursor, so neither the driver
+nor Python ever holds the whole result; on SQLite the cursor is stepped
+lazily. Output is written as rows arrive, so memory stays bounded and the
+first row shows up right away regardless of result size.
+
+Usage:
+    python streaming.py q1_active_contract_customers --out q1.csv
+    python streaming.py q5_invoice_payment_summary --format text
+"""
+
+import argparse
+import csv
+import sys
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+DEFAULT_YIELD_PER = 1000
+
+
+@dataclass
+class StreamStats:
+    rows: int = 0
+    first_row_ms: Optional[float] = None
+    total_ms: float = 0.0
+
+
+def stream_rows(session, stmt, yield_per: int = DEFAULT_YIELD_PER) -> Iterator:
+    """Yield result rows one at a time, fetching `yield_per` per round trip."""
+    # yield_per implies stream_results=True (server-side cursor where supported).
+    result = session.execute(stmt.execution_options(yield_per=yield_per))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def write_report(session, stmt, fp, fmt: str = "csv", yield_per: int = DEFAULT_YIELD_PER) -> StreamStats:
+    """Stream `stmt` to `fp` as CSV or aligned text, flushing once per batch."""
+    stats = StreamStats()
+    start = time.perf_counter()
+    writer = csv.writer(fp) if fmt == "csv" else None
+    header_written = False
+
+    for row in stream_rows(session, stmt, yield_per=yield_per):
+        if not header_written:
+            stats.first_row_ms = (time.perf_counter() - start) * 1000
+            columns = list(row._fields)
+            if writer:
+                writer.writerow(columns)
+            else:
+                fp.write("  ".join(f"{c:<20}" for c in columns) + "\n")
+            header_written = True
+
+        if writer:
+            writer.writerow(row)
+        else:
+            fp.write("  ".join(f"{str(v):<20}" for v in row) + "\n")
+        stats.rows += 1
+        if stats.rows % yield_per == 0:
+            fp.flush()
+
+    fp.flush()
+    stats.total_ms = (time.perf_counter() - start) * 1000
+    return stats
+
+
+def main():
+    from COMP353_project3 import REPORTS
+    from database import get_session
+
+    parser = argparse.ArgumentParser(description="Stream a report to a file or stdout")
+    parser.add_argument("report", choices=sorted(REPORTS))
+    parser.add_argument("--out", help="output file (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "text"], default="csv")
+    parser.add_argument("--yield-per", type=int, default=DEFAULT_YIELD_PER)
+    args = parser.parse_args()
+
+    fp = open(args.out, "w", newline="") if args.out else sys.stdout
+    try:
+        with get_session() as session:
+            stats = write_report(session, REPORTS[args.report](), fp,
+                                 fmt=args.format, yield_per=args.yield_per)
+    finally:
+        if args.out:
+            fp.close()
+
+    first = f"{stats.first_row_ms:.1f} ms" if stats.first_row_ms is not None else "n/a"
+    print(f"{stats.rows} rows, first row after {first}, total {stats.total_ms:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
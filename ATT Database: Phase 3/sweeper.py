@@ -0,0 +1,129 @@
+"""
+Overdue-invoice sweeper.
+
+Unpaid invoices whose InvoiceDueDate has passed become 'overdue'. The
+sweeper finds them through the partial index ix_invoice_unpaid_due (unpaid
+rows only, by due date), and updates them in bounded batches, one short
+transaction each:
+
+    UPDATE invoice SET InvoiceStatus = 'overdue'
+    WHERE InvoiceID IN (SELECT InvoiceID FROM invoice
+                        WHERE InvoiceStatus = 'unpaid' AND InvoiceDueDate < :today
+                        ORDER BY InvoiceDueDate LIMIT :batch
+                        FOR UPDATE SKIP LOCKED)
+    RETURNING AccountID
+
+so no transaction holds more than `batch_size` row locks, and on
+PostgreSQL rows another transaction has locked (e.g. a payment being
+recorded) are skipped and picked up on the next sweep. SQLite has no row
+locks; there each batch is simply a short write transaction. The
+invoice_account_summary rows of the accounts touched are refreshed in the
+same transaction.
+
+Usage:
+    python sweeper.py                         # one sweep, as of today
+    python sweeper.py --as-of 2025-06-01 --batch-size 5000
+    python sweeper.py --every 300             # keep sweeping every 5 minutes
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import select, update
+
+from COMP353_project3 import Invoice
+from invoice_summary import refresh_invoice_summary
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class SweepReport:
+    as_of: date
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"as of {self.as_of}: {self.rows} invoices marked overdue in {self.batches} batches, "
+            f"{self.seconds:.2f} s ({self.rows_per_second:.0f} rows/s)"
+        )
+
+
+def overdue_batch(as_of: date, batch_size: int):
+    """UPDATE marking up to `batch_size` unpaid invoices due before `as_of` overdue."""
+    due = (
+        select(Invoice.InvoiceID)
+        .where(Invoice.InvoiceStatus == "unpaid", Invoice.InvoiceDueDate < as_of)
+        .order_by(Invoice.InvoiceDueDate)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(Invoice)
+        .where(Invoice.InvoiceID.in_(due.scalar_subquery()), Invoice.InvoiceStatus == "unpaid")
+        .values(InvoiceStatus="overdue")
+        .returning(Invoice.AccountID)
+    )
+
+
+def sweep_batch(conn, as_of: date, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Mark one batch overdue on `conn`; returns the number of invoices changed."""
+    accounts = conn.execute(overdue_batch(as_of, batch_size)).scalars().all()
+    if accounts:
+        refresh_invoice_summary(conn, set(accounts))
+    return len(accounts)
+
+
+def sweep(engine, as_of: Optional[date] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+          pause: float = 0.0, log=print) -> SweepReport:
+    """Sweep until no unpaid invoice due before `as_of` (default today) is left."""
+    report = SweepReport(as_of or date.today())
+    while True:
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            rows = sweep_batch(conn, report.as_of, batch_size)
+        report.seconds += time.perf_counter() - start
+        if not rows:
+            break
+        report.rows += rows
+        report.batches += 1
+        if rows < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    if log is not None:
+        log(str(report))
+    return report
+
+
+def main():
+    from COMP353_project3 import create_schema
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Mark past-due unpaid invoices overdue")
+    parser.add_argument("--as-of", type=date.fromisoformat, help="sweep date (default today)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--every", type=float, help="keep sweeping, this many seconds apart")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    create_schema(engine)
+    while True:
+        sweep(engine, args.as_of, args.batch_size, args.pause)
+        if args.every is None:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
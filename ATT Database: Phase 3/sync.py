@@ -0,0 +1,337 @@
+"""
+Watermark-based incremental sync from an upstream system.
+
+Every upstream table carries a change column (UpdatedAt, an ISO timestamp
+string that sorts in change order). For each ATT table, sync_watermark
+remembers the (UpdatedAt, primary key) of the last row applied. A sync run
+only asks the source for rows past that mark, in keyset order and in
+batches. Each batch is upserted (upsert.py) and the mark is advanced in the
+same transaction, so:
+
+  * a run costs time proportional to the number of changed rows
+  * an interrupted run resumes from the last committed batch
+  * re-applying a batch is harmless (the upsert reports it unchanged)
+
+Tables are synced in foreign key order. Invoice batches also refresh
+invoice_account_summary for the accounts they touch, including the
+account an invoice was moved away from.
+
+Deletes are not propagated: a row removed upstream has no newer UpdatedAt
+to be found by, so it stays here until removed by other means (or the
+upstream soft-deletes it through a status column).
+
+Two sources are provided. SQLSource reads any SQLAlchemy URL, e.g. a
+SQLite stand-in for the operational database. FileSource reads <table>.jsonl
+change logs from a directory; it remembers the byte offset it has applied
+up to in <table>.jsonl.offset, so a later run reads only what was appended.
+
+Usage:
+    python sync.py --make-demo-source sqlite:////tmp/upstream.db --customers 20000
+    python sync.py --source sqlite:////tmp/upstream.db
+    python sync.py --touch-demo-source sqlite:////tmp/upstream.db --rows 500
+    python sync.py --source sqlite:////tmp/upstream.db     # only the 500 changes
+    python sync.py --source-dir feed/
+"""
+
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import Column, Date, Index, MetaData, String, Table, func, inspect, select, tuple_
+
+from bulk_load import LOAD_ORDER
+from COMP353_project3 import Base, Invoice, SyncWatermark
+from database import EngineConfig, make_engine
+from invoice_summary import refresh_invoice_summary
+from upsert import UpsertCounts, upsert
+
+CHANGE_COLUMN = "UpdatedAt"
+DEFAULT_BATCH_SIZE = 5000
+
+Watermark = Tuple[str, str]   # (change value, primary key)
+
+
+def _pk(table) -> str:
+    (column,) = table.primary_key.columns
+    return column.key
+
+
+def _engine(url: str):
+    return make_engine(replace(EngineConfig.from_env(), url=url))
+
+
+# ============================
+#          SOURCES
+# ============================
+class SQLSource:
+    """Changed rows from tables in a SQLAlchemy database, in keyset order."""
+
+    def __init__(self, url: str, change_column: str = CHANGE_COLUMN):
+        self.engine = _engine(url)
+        self.change_column = change_column
+        self._tables: Dict[str, Table] = {}
+
+    def tables(self) -> Set[str]:
+        return set(inspect(self.engine).get_table_names())
+
+    def _table(self, name: str) -> Table:
+        if name not in self._tables:
+            self._tables[name] = Table(name, MetaData(), autoload_with=self.engine)
+        return self._tables[name]
+
+    def changes(self, name: str, since: Optional[Watermark], batch_size: int) -> Iterator[List[dict]]:
+        table = self._table(name)
+        changed, key = table.c[self.change_column], table.c[_pk(Base.metadata.tables[name])]
+        while True:
+            stmt = select(table).order_by(changed, key).limit(batch_size)
+            if since is not None:
+                stmt = stmt.where(tuple_(changed, key) > tuple_(*since))
+            with self.engine.connect() as conn:
+                batch = [dict(row._mapping) for row in conn.execute(stmt)]
+            if not batch:
+                return
+            yield batch
+            since = (batch[-1][self.change_column], batch[-1][key.key])
+
+
+class FileSource:
+    """
+    Changed rows from <directory>/<table>.jsonl, one JSON object per line,
+    appended in change order (an export or change log of the upstream).
+
+    After each batch has been applied, the byte offset past it and its
+    watermark are saved to <table>.jsonl.offset. The next read seeks there
+    when that watermark is not past the one asked for (i.e. the target was
+    not reset), and starts over if the log was truncated or replaced. A
+    trailing line without its newline is left for the next run.
+    """
+
+    def __init__(self, directory: str, change_column: str = CHANGE_COLUMN):
+        self.directory = directory
+        self.change_column = change_column
+
+    def tables(self) -> Set[str]:
+        return {f[:-len(".jsonl")] for f in os.listdir(self.directory) if f.endswith(".jsonl")}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.jsonl")
+
+    def _start(self, name: str, since: Optional[Watermark]) -> int:
+        try:
+            with open(self._path(name) + ".offset") as fp:
+                saved = json.load(fp)
+        except (OSError, ValueError):
+            return 0
+        mark = tuple(saved["mark"])
+        if since is None or mark > since or saved["offset"] > os.path.getsize(self._path(name)):
+            return 0
+        return saved["offset"]
+
+    def _save(self, name: str, offset: int, mark: Watermark) -> None:
+        path = self._path(name) + ".offset"
+        with open(path + ".tmp", "w") as fp:
+            json.dump({"offset": offset, "mark": list(mark)}, fp)
+        os.replace(path + ".tmp", path)
+
+    def changes(self, name: str, since: Optional[Watermark], batch_size: int) -> Iterator[List[dict]]:
+        key = _pk(Base.metadata.tables[name])
+        batch = []
+        offset = self._start(name, since)
+        with open(self._path(name), "rb") as fp:
+            fp.seek(offset)
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                row = json.loads(line)
+                if since is not None and (row[self.change_column], row[key]) <= since:
+                    continue
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield batch
+                    # Resumed, so the caller has committed the batch.
+                    since = (batch[-1][self.change_column], batch[-1][key])
+                    self._save(name, offset, since)
+                    batch = []
+        if batch:
+            yield batch
+            since = (batch[-1][self.change_column], batch[-1][key])
+        if since is not None:
+            self._save(name, offset, since)
+
+
+# ============================
+#            SYNC
+# ============================
+@dataclass
+class TableSyncStats:
+    table: str
+    batches: int = 0
+    seconds: float = 0.0
+    counts: UpsertCounts = field(default_factory=UpsertCounts)
+
+    def __str__(self) -> str:
+        return f"{self.table:<12} {self.batches:>5} batches {self.seconds:>8.2f} s  {self.counts}"
+
+
+def _coerce(table, row: dict) -> dict:
+    """Model columns the row has; ISO date strings (JSON, untyped sources) become dates."""
+    values = {}
+    for column in table.columns:
+        if column.key not in row:
+            continue
+        value = row[column.key]
+        if isinstance(value, str) and isinstance(column.type, Date):
+            value = date.fromisoformat(value)
+        values[column.key] = value
+    return values
+
+
+def get_watermark(conn, name: str) -> Optional[Watermark]:
+    mark = conn.execute(
+        select(SyncWatermark.HighWater, SyncWatermark.HighWaterKey).where(SyncWatermark.TableName == name)
+    ).first()
+    return tuple(mark) if mark else None
+
+
+def sync_table(engine, source, name: str, batch_size: int = DEFAULT_BATCH_SIZE) -> TableSyncStats:
+    table = Base.metadata.tables[name]
+    key = _pk(table)
+    stats = TableSyncStats(name)
+
+    with engine.connect() as conn:
+        since = get_watermark(conn, name)
+        applied = conn.execute(
+            select(SyncWatermark.RowsApplied).where(SyncWatermark.TableName == name)
+        ).scalar() or 0
+
+    for batch in source.changes(name, since, batch_size):
+        start = time.perf_counter()
+        rows = [_coerce(table, row) for row in batch]
+        last = max((row[source.change_column], row[key]) for row in batch)
+        with engine.begin() as conn:
+            if name == "invoice":
+                # Accounts the invoices belong to now, so a moved invoice
+                # also leaves its old account's summary.
+                accounts = set(conn.execute(
+                    select(Invoice.AccountID).where(Invoice.InvoiceID.in_([row["InvoiceID"] for row in rows]))
+                ).scalars())
+            stats.counts += upsert(conn, table, rows)
+            if name == "invoice":
+                refresh_invoice_summary(conn, accounts | {row["AccountID"] for row in rows})
+            applied += len(rows)
+            upsert(conn, SyncWatermark, [{
+                "TableName": name,
+                "HighWater": last[0],
+                "HighWaterKey": last[1],
+                "RowsApplied": applied,
+                "SyncedAt": datetime.now(timezone.utc).replace(tzinfo=None),
+            }])
+        stats.batches += 1
+        stats.seconds += time.perf_counter() - start
+    return stats
+
+
+def sync(engine, source, batch_size: int = DEFAULT_BATCH_SIZE, log=print) -> List[TableSyncStats]:
+    """Sync every table the source has, parents first."""
+    available = source.tables()
+    results = []
+    for name in LOAD_ORDER:
+        if name in available:
+            stats = sync_table(engine, source, name, batch_size)
+            results.append(stats)
+            if log is not None:
+                log(str(stats))
+    return results
+
+
+# ============================
+#        DEMO SOURCE
+# ============================
+def _source_tables(metadata: MetaData) -> Dict[str, Table]:
+    tables = {}
+    for name in LOAD_ORDER:
+        model = Base.metadata.tables[name]
+        table = Table(
+            name, metadata,
+            *(Column(c.key, c.type, primary_key=c.primary_key) for c in model.columns),
+            Column(CHANGE_COLUMN, String(40), nullable=False),
+        )
+        Index(f"ix_{name}_changes", table.c[CHANGE_COLUMN], table.c[_pk(model)])
+        tables[name] = table
+    return tables
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def make_demo_source(url: str, customers: int, seed: int = 353) -> None:
+    """An upstream stand-in: the datagen dataset plus an UpdatedAt column."""
+    import datagen
+
+    engine = _engine(url)
+    metadata = MetaData()
+    tables = _source_tables(metadata)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    stamp = _now()
+    with engine.begin() as conn:
+        for chunk in datagen.generate(customers, seed=seed):
+            for name, rows in chunk.items():
+                rows = [{**{k: v for k, v in row.items() if not k.startswith("_")}, CHANGE_COLUMN: stamp}
+                        for row in rows]
+                if rows:
+                    conn.execute(tables[name].insert(), rows)
+
+
+def touch_demo_source(url: str, rows: int) -> None:
+    """Simulate upstream activity: mark `rows` random unpaid invoices paid."""
+    engine = _engine(url)
+    invoice = _source_tables(MetaData())["invoice"]
+    with engine.begin() as conn:
+        ids = conn.execute(
+            select(invoice.c.InvoiceID).where(invoice.c.InvoiceStatus != "paid").order_by(func.random()).limit(rows)
+        ).scalars().all()
+        conn.execute(
+            invoice.update().where(invoice.c.InvoiceID.in_(ids)).values(InvoiceStatus="paid", **{CHANGE_COLUMN: _now()})
+        )
+
+
+def main():
+    from COMP353_project3 import create_schema
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Incremental sync from an upstream source")
+    parser.add_argument("--source", help="SQLAlchemy URL of the upstream database")
+    parser.add_argument("--source-dir", help="directory of <table>.jsonl change logs")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--make-demo-source", metavar="URL", help="create a demo upstream database")
+    parser.add_argument("--touch-demo-source", metavar="URL", help="change some rows in a demo upstream")
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--rows", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.make_demo_source:
+        make_demo_source(args.make_demo_source, args.customers)
+        return
+    if args.touch_demo_source:
+        touch_demo_source(args.touch_demo_source, args.rows)
+        return
+    if not (args.source or args.source_dir):
+        parser.error("one of --source or --source-dir is required")
+
+    engine = get_engine()
+    create_schema(engine)
+    source = SQLSource(args.source) if args.source else FileSource(args.source_dir)
+    start = time.perf_counter()
+    sync(engine, source, args.batch_size)
+    print(f"sync finished in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
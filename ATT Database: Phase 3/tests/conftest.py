@@ -0,0 +1,35 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+# The Phase 3 modules are scripts side by side, not a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from COMP353_project3 import Account, Customer, create_schema  # noqa: E402
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    create_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def accounts(engine):
+    """One customer with accounts A1 and A2."""
+    with Session(engine) as session:
+        session.add(Customer(CustomerID="C1", CustomerFirstName="Emma", CustomerLastName="Johnson",
+                             CustomerEmail="emma@example.com", CustomerPhoneNumber="3125551234",
+                             CustomerAddress="123 Oak St"))
+        for account_id in ("A1", "A2"):
+            session.add(Account(AccountID=account_id, CustomerID="C1", AccountBalance=0.0,
+                                AccountType="Mobile", AccountStatus="active",
+                                AccountCreatedDate=date(2024, 1, 1)))
+        session.commit()
+    return ["A1", "A2"]
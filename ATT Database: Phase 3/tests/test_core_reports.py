@@ -0,0 +1,17 @@
+from sqlalchemy import select
+
+from COMP353_project3 import Account
+from core_reports import fetch_tuples, iter_tuples
+
+
+def test_in_list_on_raw_cursor(engine, accounts):
+    stmt = select(Account.AccountID).where(Account.AccountID.in_(accounts)).order_by(Account.AccountID)
+    with engine.connect() as conn:
+        assert fetch_tuples(conn, stmt) == [("A1",), ("A2",)]
+
+
+def test_two_open_exports_on_one_connection(engine, accounts):
+    stmt = select(Account.AccountID).order_by(Account.AccountID)
+    with engine.connect() as conn:
+        first, second = iter_tuples(conn, stmt, batch_size=1), iter_tuples(conn, stmt, batch_size=1)
+        assert list(zip(first, second)) == [(("A1",), ("A1",)), (("A2",), ("A2",))]
@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from instrumentation import Instrumentation
+
+
+def test_failed_statement_pops_its_start_time(engine):
+    metrics = Instrumentation(slow_ms=None)
+    metrics.attach(engine, session_target=None)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            assert conn.info["instrumentation_start"] == []
+            conn.execute(text("SELECT 1"))
+    finally:
+        metrics.detach()
+    assert "raw_connection" not in vars(engine)
+
+
+def test_checkout_wait_is_measured(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool,
+                           pool_size=1, max_overflow=0)
+    metrics = Instrumentation(slow_ms=None)
+    metrics.attach(engine, session_target=None)
+    held = threading.Event()
+
+    def hold():
+        with engine.connect():
+            held.set()
+            time.sleep(0.2)
+
+    try:
+        holder = threading.Thread(target=hold)
+        holder.start()
+        held.wait()
+        with engine.connect() as conn:  # queues behind the holder
+            conn.execute(text("SELECT 1"))
+        holder.join()
+    finally:
+        metrics.detach()
+        engine.dispose()
+    assert metrics.checkouts == 2
+    assert 0.1 <= metrics.checkout_wait_max <= metrics.checkout_wait_seconds
@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from COMP353_project3 import Invoice, InvoiceAccountSummary
+from invoice_summary import _aggregate, disable_incremental_refresh, enable_incremental_refresh
+
+
+@pytest.fixture
+def session(engine, accounts):
+    with Session(engine) as session:
+        enable_incremental_refresh(session)
+        session.add_all([
+            Invoice(InvoiceID="I1", AccountID="A1", InvoiceDate=date(2024, 1, 1),
+                    InvoiceDueDate=date(2024, 1, 31), InvoiceAmount=10.0, InvoiceStatus="unpaid"),
+            Invoice(InvoiceID="I2", AccountID="A1", InvoiceDate=date(2024, 2, 1),
+                    InvoiceDueDate=date(2024, 3, 2), InvoiceAmount=5.0, InvoiceStatus="unpaid"),
+        ])
+        session.commit()
+        yield session
+        disable_incremental_refresh(session)
+
+
+def assert_summary_matches(session):
+    summary = session.execute(select(InvoiceAccountSummary.__table__).order_by("AccountID")).all()
+    expected = session.execute(_aggregate().order_by(Invoice.AccountID)).all()
+    assert [tuple(r) for r in summary if r.NumInvoices] == [tuple(r) for r in expected]
+
+
+def test_update_after_commit(session):
+    invoice = session.get(Invoice, "I1")
+    session.commit()  # expires the invoice: no history until reloaded
+    invoice.InvoiceStatus = "paid"
+    session.commit()
+    assert_summary_matches(session)
+
+
+def test_move_and_reprice_after_commit(session):
+    invoice = session.get(Invoice, "I2")
+    session.commit()
+    invoice.AccountID = "A2"
+    invoice.InvoiceAmount = 7.5
+    session.commit()
+    assert_summary_matches(session)
+
+
+def test_delete_after_commit(session):
+    invoice = session.get(Invoice, "I1")
+    session.commit()
+    session.delete(invoice)
+    session.commit()
+    assert_summary_matches(session)
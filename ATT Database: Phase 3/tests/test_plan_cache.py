@@ -0,0 +1,30 @@
+from datetime import date
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from COMP353_project3 import Contract, Plan, underfunded_active_contracts
+from plan_cache import PlanCache, underfunded_active_contracts_cached
+
+
+def _same_as_join(engine, cache):
+    with engine.connect() as conn:
+        joined = sorted(map(tuple, conn.execute(underfunded_active_contracts()).all()))
+        return sorted(underfunded_active_contracts_cached(conn, cache)) == joined
+
+
+def test_empty_plan_table(engine):
+    assert _same_as_join(engine, PlanCache())
+
+
+def test_plan_added_after_load(engine, accounts):
+    cache = PlanCache(check_interval=3600)
+    with engine.connect() as conn:
+        cache.plans(conn)  # loaded while plan is empty
+    with Session(engine) as session:
+        session.execute(insert(Plan).values(PlanID="P1", PlanName="Basic", PlanMonthlyFee=25.0,
+                                            PlanShareable=False))
+        session.add(Contract(ContractID="K1", AccountID="A1", PlanID="P1", ContractStatus="active",
+                             ContractStartDate=date(2024, 1, 1), ContractEndDate=date(2026, 1, 1)))
+        session.commit()
+    assert _same_as_join(engine, cache)
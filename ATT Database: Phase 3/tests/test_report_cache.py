@@ -0,0 +1,17 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from COMP353_project3 import Account
+from report_cache import ReportCache
+
+
+def test_cached_rows_are_not_shared_mutably(engine, accounts):
+    cache = ReportCache()
+    stmt = select(Account.AccountID).order_by(Account.AccountID)
+    with Session(engine) as session:
+        first = cache.execute(session, stmt)
+        rows = list(first)
+        rows.pop()
+        assert isinstance(first, tuple)
+        assert [r.AccountID for r in cache.execute(session, stmt)] == accounts
+    assert cache.stats()["hits"] == 1
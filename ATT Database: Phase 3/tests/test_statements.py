@@ -0,0 +1,22 @@
+import datagen
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from COMP353_project3 import Customer
+from statements import STATEMENT_BATCH_SIZE, count_queries, iter_statements
+
+# customers, accounts, contracts, plans, devices, invoices
+QUERIES_PER_BATCH = 6
+
+
+def test_statement_query_count_is_constant_per_batch(engine):
+    # Fixed seed: 300 customers with ~450 accounts, i.e. two batches whose
+    # accounts each fit in one selectinload IN list.
+    datagen.load(engine, 300, seed=datagen.DEFAULT_SEED)
+    with Session(engine) as session:
+        ids = session.scalars(select(Customer.CustomerID).order_by(Customer.CustomerID)).all()
+        with count_queries(engine) as queries:
+            statements = list(iter_statements(session, ids, STATEMENT_BATCH_SIZE))
+
+    assert len(statements) == 300
+    assert len(queries) == 2 * QUERIES_PER_BATCH, "\n".join(queries)
@@ -0,0 +1,30 @@
+from sqlalchemy import func, select
+
+from COMP353_project3 import Customer, seed_data
+from upsert import upsert_all
+
+
+def _customer(customer_id, email):
+    return {"CustomerID": customer_id, "CustomerFirstName": "Liam", "CustomerLastName": "Smith",
+            "CustomerEmail": email, "CustomerPhoneNumber": "3125550000", "CustomerAddress": "1 Elm St"}
+
+
+def test_seed_rerun_is_unchanged(engine):
+    upsert_all(engine, seed_data(), log=None)
+    report = upsert_all(engine, seed_data(), log=None)
+    assert all(c.inserted == c.updated == 0 for c in report.tables.values())
+
+
+def test_taken_email_is_rejected_not_fatal(engine):
+    upsert_all(engine, {"customer": [_customer("C1", "liam@example.com")]}, log=None)
+    report = upsert_all(engine, {"customer": [
+        _customer("C2", "liam@example.com"),   # taken by C1 in the table
+        _customer("C3", "new@example.com"),
+        _customer("C4", "new@example.com"),    # taken by C3 earlier in the batch
+    ]}, log=None)
+
+    counts = report.tables["customer"]
+    assert (counts.inserted, counts.rejected) == (1, 2)
+    assert [key for key, _ in counts.rejects] == [("C2",), ("C4",)]
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Customer)).scalar() == 2
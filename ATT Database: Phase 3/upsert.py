@@ -0,0 +1,268 @@
+"""
+Idempotent bulk upsert for the ATT tables.
+
+Rows are written in batches with INSERT ... ON CONFLICT (primary key) DO
+UPDATE, so a feed can be applied any number of times. The DO UPDATE only
+fires for rows where some column actually differs (IS DISTINCT FROM), and
+every batch reports how many rows were inserted, updated or left
+unchanged:
+
+  * PostgreSQL - RETURNING (xmax = 0): a freshly inserted row version has
+                 no xmax, an updated one does. Rows skipped by the WHERE
+                 are not returned, so they are the unchanged ones.
+  * SQLite     - RETURNING the primary key, plus one SELECT per batch for
+                 the keys that already existed.
+
+Either way it is one or two statements per batch, never a read per row.
+
+ON CONFLICT can only name one target, the primary key, so the other
+unique constraints (customer.CustomerEmail, device.DeviceIMEI) are checked
+up front, one SELECT per constraint per batch: a row whose value belongs
+to another key, in the table or earlier in the batch, is rejected and
+listed in UpsertCounts.rejects instead of failing the whole transaction.
+Rows that reference a rejected row (e.g. the accounts of a customer
+rejected for its email) still need that row to exist.
+
+Only the columns a row carries are written: a dict without a key, or an
+ORM instance with the attribute never set, leaves that column as it is on
+update (and to its default on insert), instead of overwriting it with
+NULL. A batch holding rows of different shapes runs one statement per
+shape. Rows must carry the primary key.
+
+The conflict target is the primary key as the database has it, read once
+per upsert() call on PostgreSQL: a partitioned invoice table
+(partitioning.py) is keyed on (InvoiceID, InvoiceDate), not InvoiceID
+alone. There, a row whose InvoiceDate changed is a new key, so it is
+inserted rather than updated.
+
+Usage:
+    from upsert import upsert, upsert_all
+    counts = upsert(conn, Customer, rows)
+    upsert_all(engine, seed_data())        # re-runnable seed
+
+    python upsert.py --seed                # apply seed_data() again
+"""
+
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import UniqueConstraint, inspect, literal_column, or_, select, tuple_
+
+from bulk_load import LOAD_ORDER, _batches, _table_name
+from COMP353_project3 import Base
+from invoice_summary import dialect_insert
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class UpsertCounts:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # (key, reason) of rows not written because of a unique constraint.
+    rejects: List[Tuple[tuple, str]] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+    @property
+    def rejected(self) -> int:
+        return len(self.rejects)
+
+    def __iadd__(self, other: "UpsertCounts") -> "UpsertCounts":
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.rejects.extend(other.rejects)
+        return self
+
+    def __str__(self) -> str:
+        text = f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged"
+        return f"{text}, {self.rejected} rejected" if self.rejects else text
+
+
+@dataclass
+class UpsertReport:
+    tables: Dict[str, UpsertCounts] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        return "\n".join(f"{name:<12} {counts}" for name, counts in self.tables.items())
+
+
+def _table(model_or_table):
+    if hasattr(model_or_table, "__table__"):
+        return model_or_table.__table__
+    if isinstance(model_or_table, str):
+        return Base.metadata.tables[model_or_table]
+    return model_or_table
+
+
+def _provided_values(table, row, required) -> dict:
+    """The columns `row` (a dict or ORM instance) carries; a None with a scalar default becomes it."""
+    if not isinstance(row, dict):
+        row = {k: v for k, v in inspect(row).dict.items() if k in table.c}
+    missing = [c.key for c in required if c.key not in row]
+    if missing:
+        raise ValueError(f"{table.name} row without key column(s) {missing}: {row!r}")
+    values = {}
+    for column in table.columns:
+        if column.key not in row:
+            continue
+        value = row[column.key]
+        if value is None and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+        values[column.key] = value
+    return values
+
+
+def _dedupe(target, batch):
+    # One statement cannot touch the same row twice, so rows for one key are
+    # merged in order, as if they were applied one after another.
+    keys = [c.key for c in target]
+    by_key = {}
+    for row in batch:
+        key = tuple(row[k] for k in keys)
+        by_key[key] = {**by_key.get(key, {}), **row}
+    return list(by_key.values())
+
+
+def _by_shape(batch):
+    # executemany needs the same columns in every row.
+    shapes: Dict[frozenset, list] = {}
+    for row in batch:
+        shapes.setdefault(frozenset(row), []).append(row)
+    return shapes.values()
+
+
+def unique_keys(table) -> List[list]:
+    """Column lists of the table's unique constraints and unique indexes, besides the primary key."""
+    keys = [list(c.columns) for c in table.constraints if isinstance(c, UniqueConstraint)]
+    keys += [list(i.columns) for i in table.indexes if i.unique]
+    return keys
+
+
+def _reject_unique_conflicts(conn, table, batch, target, counts: UpsertCounts) -> list:
+    """`batch` without the rows that would break a unique constraint other than `target`'s."""
+    target_keys = [c.key for c in target]
+    for columns in unique_keys(table):
+        names = [c.key for c in columns]
+
+        def value(row):
+            if any(row.get(n) is None for n in names):
+                return None  # not carried, or NULL: neither can conflict
+            return tuple(row[n] for n in names)
+
+        values = {v for v in map(value, batch) if v is not None}
+        if not values:
+            continue
+        match = columns[0].in_([v[0] for v in values]) if len(columns) == 1 else tuple_(*columns).in_(values)
+        owners = {
+            tuple(r[:len(names)]): tuple(r[len(names):])
+            for r in conn.execute(select(*columns, *target).where(match))
+        }
+        kept = []
+        for row in batch:
+            v, key = value(row), tuple(row[k] for k in target_keys)
+            owner = owners.get(v) if v is not None else None
+            if owner is not None and owner != key:
+                counts.rejects.append((key, f"{table.name}.{'/'.join(names)} {v!r} belongs to {owner!r}"))
+                continue
+            if v is not None:
+                owners[v] = key  # later rows in the batch must not take it either
+            kept.append(row)
+        batch = kept
+    return batch
+
+
+def conflict_target(conn, table) -> list:
+    """The table's primary key columns as declared in the database."""
+    if conn.dialect.name == "postgresql":
+        names = inspect(conn).get_pk_constraint(table.name)["constrained_columns"]
+        if names:
+            return [table.c[name] for name in names]
+    return list(table.primary_key.columns)
+
+
+def _upsert_batch(conn, table, batch, update_columns: Sequence[str], target) -> UpsertCounts:
+    pk = list(table.primary_key.columns)
+    update_columns = [c for c in update_columns if c not in {t.key for t in target}]
+    stmt = dialect_insert(conn)(table)
+    if update_columns:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=target,
+            set_={c: stmt.excluded[c] for c in update_columns},
+            where=or_(*(table.c[c].is_distinct_from(stmt.excluded[c]) for c in update_columns)),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=target)
+
+    if conn.dialect.name == "postgresql":
+        flags = conn.execute(stmt.returning(literal_column("(xmax = 0)")), batch).scalars().all()
+        inserted = sum(1 for f in flags if f)
+        return UpsertCounts(inserted, len(flags) - inserted, len(batch) - len(flags))
+
+    keys = [tuple(row[c.key] for c in pk) for row in batch]
+    existing = set(conn.execute(select(*pk).where(tuple_(*pk).in_(keys))).all())
+    written = conn.execute(stmt.returning(*pk), batch).all()
+    inserted = sum(1 for key in written if tuple(key) not in existing)
+    return UpsertCounts(inserted, len(written) - inserted, len(batch) - len(written))
+
+
+def upsert(conn, model_or_table, rows: Iterable, batch_size: int = DEFAULT_BATCH_SIZE,
+           update_columns: Optional[Sequence[str]] = None) -> UpsertCounts:
+    """
+    Insert or update `rows` (dicts or ORM instances) of one table on `conn`.
+    Columns a row leaves out are not touched on update. NOT NULL is still
+    checked on the proposed row before the conflict is, so a row must carry
+    the NOT NULL columns without defaults even when it only updates.
+    update_columns defaults to every non-key column; pass [] to only insert
+    missing rows.
+    """
+    table = _table(model_or_table)
+    if update_columns is None:
+        update_columns = [c.key for c in table.columns if not c.primary_key]
+    target = conflict_target(conn, table)
+    required = {*table.primary_key.columns, *target}
+    counts = UpsertCounts()
+    for batch in _batches((_provided_values(table, row, required) for row in rows), batch_size):
+        batch = _reject_unique_conflicts(conn, table, _dedupe(target, batch), target, counts)
+        for shape in _by_shape(batch):
+            present = [c for c in update_columns if c in shape[0]]
+            counts += _upsert_batch(conn, table, shape, present, target)
+    return counts
+
+
+def upsert_all(engine, data: dict, batch_size: int = DEFAULT_BATCH_SIZE,
+               log=print) -> UpsertReport:
+    """Upsert `data` (table name or model -> rows) in foreign key order, one transaction."""
+    by_table = {_table_name(key): rows for key, rows in data.items()}
+    report = UpsertReport()
+    with engine.begin() as conn:
+        for name in LOAD_ORDER:
+            if name in by_table:
+                report.tables[name] = upsert(conn, name, by_table[name], batch_size)
+    if log is not None:
+        log(str(report))
+    return report
+
+
+def main():
+    from COMP353_project3 import create_schema, seed_data
+    from database import get_engine
+
+    parser = argparse.ArgumentParser(description="Idempotently apply the seed data")
+    parser.add_argument("--seed", action="store_true", help="upsert seed_data()")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    create_schema(engine)
+    if args.seed:
+        upsert_all(engine, seed_data(), args.batch_size)
+
+
+if __name__ == "__main__":
+    main()